@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from history import logged_activities
+from models import Activity, User_Exercise_Stats
+
+DEFAULT_WINDOW = 4
+MAX_WINDOW = 52
+CACHE_SIZE = 1024
+
+def load_columns(user_id, exercise_id):
+    """Returns a user's logged datetimes, weights, reps and sets for an exercise as arrays, oldest first, from one query"""
+    rows = (logged_activities(user_id, exercise_id)
+                    .with_entities(Activity.datetime, Activity.weight, Activity.reps, Activity.sets)
+                    .order_by(Activity.datetime, Activity.id)
+                    .all())
+    if not rows:
+        return np.array([], dtype='datetime64[s]'), np.array([]), np.array([]), np.array([])
+    datetimes, weights, reps, sets = zip(*rows)
+    # Missing stats become NaN, so they drop out of maxima and sums
+    return (np.array(datetimes, dtype='datetime64[s]'),
+            np.array(weights, dtype=float),
+            np.array(reps, dtype=float),
+            np.array(sets, dtype=float))
+
+def estimated_one_rep_max(weights, reps):
+    """Epley estimate of the weight that could be lifted once: weight x (1 + reps / 30), or the weight itself for single reps"""
+    estimate = weights * (1 + reps / 30)
+    return np.where(reps == 1, weights, np.where(reps > 0, estimate, np.nan))
+
+def group_max(values, groups, group_count):
+    """Returns the largest non-NaN value in each group, or NaN for groups without one"""
+    maxima = np.full(group_count, -np.inf)
+    np.maximum.at(maxima, groups, np.where(np.isnan(values), -np.inf, values))
+    return np.where(np.isneginf(maxima), np.nan, maxima)
+
+def group_sum(values, groups, group_count):
+    """Returns the sum of the non-NaN values in each group"""
+    return np.bincount(groups, weights=np.nan_to_num(values), minlength=group_count)
+
+def rolling_mean(values, window):
+    """Returns the mean of each value and the window - 1 before it, ignoring NaNs"""
+    present = ~np.isnan(values)
+    sums = np.concatenate(([0], np.cumsum(np.where(present, values, 0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    start = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    window_counts = counts[1:] - counts[start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_counts > 0, (sums[1:] - sums[start]) / window_counts, np.nan)
+
+def progression_slope(days, values):
+    """Returns the least squares trend of the values in units per week, or None with fewer than two sessions"""
+    present = ~np.isnan(values)
+    if np.count_nonzero(present) < 2 or np.ptp(days[present]) == 0:
+        return None
+    slope_per_day = np.polyfit(days[present].astype(float), values[present], 1)[0]
+    return float(slope_per_day * 7)
+
+def to_list(values):
+    """Converts an array to a JSON-ready list, with NaN as None"""
+    return [None if np.isnan(value) else round(float(value), 2) for value in values]
+
+def compute_analytics(datetimes, weights, reps, sets, window=DEFAULT_WINDOW):
+    """Returns per-session bests and rolling averages, weekly volume and the estimated one-rep max trend.
+
+    A session is a calendar day.  Everything is computed with array operations over the columns, not per row.
+    """
+    days = datetimes.astype('datetime64[D]')
+    session_days, session_of = np.unique(days, return_inverse=True)
+    session_count = len(session_days)
+    one_rep_max = group_max(estimated_one_rep_max(weights, reps), session_of, session_count)
+    top_weight = group_max(weights, session_of, session_count)
+    volume = sets * reps * weights
+    session_volume = group_sum(volume, session_of, session_count)
+
+    # numpy counts days from the 1970-01-01 epoch, a Thursday, so weeks start on Monday after shifting by 3 days
+    week_starts = days - ((days.astype(int) + 3) % 7).astype('timedelta64[D]')
+    weeks, week_of = np.unique(week_starts, return_inverse=True)
+    weekly_volume = group_sum(volume, week_of, len(weeks))
+
+    return {
+        'window': window,
+        'sessions': [{'date': str(day), 'top_weight': top, 'estimated_1rm': estimate, 'rolling_1rm': rolling,
+                        'rolling_top_weight': rolling_top, 'volume': session_total}
+                    for day, top, estimate, rolling, rolling_top, session_total
+                    in zip(session_days, to_list(top_weight), to_list(one_rep_max), to_list(rolling_mean(one_rep_max, window)),
+                        to_list(rolling_mean(top_weight, window)), to_list(session_volume))],
+        'weekly_volume': [{'week': str(week), 'volume': total} for week, total in zip(weeks, to_list(weekly_volume))],
+        'progression': {'estimated_1rm_per_week': progression_slope(session_days.astype(int), one_rep_max),
+                        'sessions': session_count},
+    }
+
+class AnalyticsCache:
+    """Memoizes analytics per (user, exercise, window), for as long as the user's data for the exercise is unchanged.
+
+    The data version is the summary row's version, which changes in the same transaction as any logged activity
+    for the pair (see exercise_stats), so a cached result is never served after the data behind it changes.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, exercise_id, window=DEFAULT_WINDOW):
+        """Returns the analytics for a user's logged activities of an exercise, with rolling averages over `window` sessions"""
+        if not 1 <= window <= MAX_WINDOW:
+            raise ValueError(f"window must be between 1 and {MAX_WINDOW}")
+        summary = User_Exercise_Stats.query.get((user_id, exercise_id))
+        version = summary.version if summary else None
+        key = (user_id, exercise_id, window)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        result = compute_analytics(*load_columns(user_id, exercise_id), window=window)
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return result
+
+analytics_cache = AnalyticsCache()
@@ -1,17 +1,36 @@
 import os
 import requests as requests
 
-from flask import Flask, render_template, jsonify, request, flash, redirect, session, g
+from flask import Flask, render_template, request, flash, redirect, session, g, abort, Response
 from flask_debugtoolbar import DebugToolbarExtension
+from flask_migrate import Migrate
 from sqlalchemy.exc import IntegrityError
 
 from forms import CreateUserForm, AuthenticateForm
-from models import db, connect_db, User, Exercise, Activity, Workout, Workout_Activity
+from models import db, connect_db, User, Activity, Workout, Workout_Activity, User_Exercise_Stats
+from batch import apply_activity_batch, update_activity_values, clean_values, BatchError
+from analytics import analytics_cache, DEFAULT_WINDOW
+from catalog import exercise_catalog, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+import catalog_sync
+from exercise_info import exercise_info_cache
+from fast_json import jsonify
+import fast_json
+from feed import public_feed, shared_workouts_page
+from exercise_stats import refresh_exercise_stats, activity_pairs, workout_pairs
+import exercise_stats
+from history import exercise_history, stat_aggregates, parse_date
 from messages import *
+from pagination import keyset_page, DEFAULT_PAGE_SIZE
+from passwords import password_hasher, HashingQueueFull
+import metrics
+import request_stats
+import runtime_config
 from functools import wraps
 
 
 USER_KEY = "curr_user"
+USERNAME_KEY = "curr_username"
+WORKOUTS_PAGE_SIZE = 24
 
 app = Flask(__name__)
 
@@ -23,26 +42,78 @@ if uri.startswith("postgres://"):
 app.config['SQLALCHEMY_DATABASE_URI'] = uri
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = runtime_config.engine_options()
 app.config['SQLALCHEMY_ECHO'] = False
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = True
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "iamsecret")
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
+app.config['BASE_URL'] = os.environ.get('BASE_URL', "http://127.0.0.1:5000")
+app.config['WGER_API_URL'] = os.environ.get('WGER_API_URL', "https://wger.de/api/v2")
+app.config['EXERCISE_INFO_TTL'] = int(os.environ.get('EXERCISE_INFO_TTL', 7 * 24 * 60 * 60))
+app.config['EXERCISE_INFO_STALE_TTL'] = int(os.environ.get('EXERCISE_INFO_STALE_TTL', 30 * 24 * 60 * 60))
+# bcrypt work factor; existing hashes are upgraded (or downgraded) to it as their users log in
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+hash_limits = runtime_config.password_hash_limits()
+app.config['PASSWORD_HASH_WORKERS'] = hash_limits['workers']
+app.config['PASSWORD_HASH_QUEUE_DEPTH'] = hash_limits['queue_depth']
+# Requests spending at least this long in the database, or issuing this many statements, are logged
+app.config['SQL_LOG_THRESHOLD_MS'] = int(os.environ.get('SQL_LOG_THRESHOLD_MS', 100))
+app.config['SQL_LOG_THRESHOLD_QUERIES'] = int(os.environ.get('SQL_LOG_THRESHOLD_QUERIES', 25))
 toolbar = DebugToolbarExtension(app)
 
 connect_db(app)
+migrate = Migrate(app, db)
+password_hasher.init_app(app)
+request_stats.init_app(app)
+metrics.init_app(app, db)
+exercise_stats.init_app(app)
+catalog_sync.init_app(app)
+fast_json.init_app(app)
+
+class StaleSession(Exception):
+    """The signed session names a user that no longer exists"""
+
+class Principal:
+    """The logged in user as carried in the signed session.
+
+    The id (and username, once logged in through the app) are available without a query; any other User
+    attribute loads the user's row on first use, raising StaleSession if the user has been deleted.
+    """
+
+    def __init__(self, id, username=None):
+        self.id = id
+        self._username = username
+        self._user = None
+
+    @property
+    def user(self):
+        """The full User row, loaded on first access"""
+        if self._user is None:
+            self._user = User.query.get(self.id)
+            if self._user is None:
+                raise StaleSession(self.id)
+        return self._user
+
+    @property
+    def username(self):
+        return self._username if self._username is not None else self.user.username
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
 
 @app.before_request
 def assign_globals():
-    """If session has a user key, assign user to Flask global."""
+    """If session has a user key, assign the user's principal to Flask global."""
 
-    g.user = User.query.get(session[USER_KEY]) if USER_KEY in session else None
+    g.user = Principal(session[USER_KEY], session.get(USERNAME_KEY)) if USER_KEY in session else None
     g.APP_NAME = "Workout Spotter"
-    g.BASE_URL = os.environ.get('BASE_URL',"http://127.0.0.1:5000")
+    g.BASE_URL = app.config['BASE_URL']
 
 def session_login(user):
     """Log in user."""
 
     session[USER_KEY] = user.id
+    session[USERNAME_KEY] = user.username
 
 
 def session_logout():
@@ -50,6 +121,36 @@ def session_logout():
 
     if USER_KEY in session:
         del session[USER_KEY]
+    session.pop(USERNAME_KEY, None)
+
+def logged_out_response():
+    """Logs out a session whose user was deleted and answers the request as if it had been made logged out"""
+    session_logout()
+    if request.path.startswith('/api/'):
+        response_json = {'response': unauthorized_access_message}
+        return (response_json,401)
+    flash(unauthorized_access_message, "danger")
+    return redirect("/")
+
+@app.errorhandler(StaleSession)
+def handle_stale_session(error):
+    return logged_out_response()
+
+@app.errorhandler(IntegrityError)
+def handle_integrity_error(error):
+    """Writes by a deleted user's session break a foreign key to users; since the session's user is not looked up on
+    every request, that is when it is checked.  Any other integrity error is a server error."""
+    db.session.rollback()
+    if g.get('user') is not None and User.query.get(g.user.id) is None:
+        return logged_out_response()
+    raise error
+
+def exercise_or_404(exercise_name):
+    """Returns the serialized exercise with a name from the in-process catalog, or aborts with 404"""
+    exercise = exercise_catalog.find(exercise_name)
+    if exercise is None:
+        abort(404)
+    return exercise
 
 def redirect_if_logged_out(func):
     """ If no user is logged in, redirect to home page"""
@@ -90,7 +191,11 @@ def signup():
         username = signup_form.username.data.lower()
         email = signup_form.email.data
         password = signup_form.password.data
-        new_user = User.signup(username,email,password)
+        try:
+            new_user = User.signup(username,email,password)
+        except HashingQueueFull:
+            flash(login_busy_message,'notify')
+            return render_template('signup.html',form=signup_form), 503, {'Retry-After': '1'}
         if not new_user:  #If signup does not return a user, flash error message and redirect
             flash(f"Error creating account",'notify')
             return redirect('/signup')
@@ -109,7 +214,11 @@ def login():
     if auth_form.validate_on_submit():
         username = auth_form.username.data.lower()
         password = auth_form.password.data
-        user = User.authenticate(username,password)
+        try:
+            user = User.authenticate(username,password)
+        except HashingQueueFull:
+            flash(login_busy_message,'notify')
+            return render_template('login.html',form=auth_form), 503, {'Retry-After': '1'}
         if user:
             session_login(user)
             flash(successful_login_message,'success')
@@ -131,26 +240,32 @@ def logout():
 @app.route('/users/<int:user_id>/workouts')
 @redirect_if_logged_out
 def view_workouts(user_id):
-    """Show a user's workouts.  If viewing user's own workouts, show all; otherwise, show only shared workouts"""
+    """Show a page of a user's workouts, newest first.  If viewing user's own workouts, show all; otherwise, show only shared workouts"""
     user = User.query.get_or_404(user_id)
-    if g.user.id == user.id:
-        return render_template('Workout/workouts.html',workouts=user.workouts.order_by(Workout.datetime.desc()))
-    else:
-        shared_workouts = []
-        for workout in user.workouts:
-            if not workout.is_private:
-                shared_workouts.append(workout)
-        return render_template('Workout/workouts.html',workouts=shared_workouts)
+    workouts = Workout.query.filter_by(creator=user.id)
+    if g.user.id != user.id:
+        workouts = workouts.filter_by(is_private=False)
+    try:
+        workouts, next_cursor = keyset_page(workouts, Workout.datetime, Workout.id,
+                            after=request.args.get('after'),
+                            limit=WORKOUTS_PAGE_SIZE,
+                            descending=True)
+    except ValueError:
+        abort(400)
+    return render_template('Workout/workouts.html',workouts=workouts,cards=Workout.load_cards(workouts),next_cursor=next_cursor)
 
 @app.route('/workouts')
 def show_all_workouts():
-    """Show all shared workouts"""
-    recent_workouts = (Workout.query
-                    .order_by(Workout.datetime.desc())
-                    .filter_by(is_private=False)
-                    .limit(12)
-                    .all())
-    return render_template('Workout/workouts.html',workouts=recent_workouts)
+    """Show a page of shared workouts, newest first.  The first page is served from the public feed cache"""
+    after = request.args.get('after')
+    if after:
+        try:
+            workouts, cards, next_cursor = shared_workouts_page(WORKOUTS_PAGE_SIZE, after=after)
+        except ValueError:
+            abort(400)
+    else:
+        workouts, cards, next_cursor = public_feed.first_page(WORKOUTS_PAGE_SIZE)[:3]
+    return render_template('Workout/workouts.html',workouts=workouts,cards=cards,next_cursor=next_cursor)
 
 @app.route('/workouts/new')
 @redirect_if_logged_out
@@ -176,25 +291,9 @@ def show_workout(workout_id):
 def clone_workout(workout_id):
     """Creates a clone of any user's workout, assigned to the logged in user"""
     workout = Workout.query.get_or_404(workout_id)
-    cloned_workout = Workout(creator=g.user.id, name=workout.name, is_private=True, is_logged=True)
-    db.session.add(cloned_workout)
+    cloned_workout = workout.clone(g.user.id)
+    refresh_exercise_stats(workout_pairs([cloned_workout.id]))
     db.session.commit()
-    for activity in workout.workout_activities:
-        cloned_activity=Activity(performed_by=g.user.id,
-                            exercise_id=activity.exercise_id,
-                            weight=activity.weight,
-                            weight_units=activity.weight_units,
-                            reps=activity.reps,
-                            sets=activity.sets,
-                            duration=activity.duration,
-                            duration_units=activity.duration_units,
-                            distance=activity.distance,
-                            distance_units=activity.distance_units)
-        db.session.add(cloned_activity)
-        db.session.commit()
-        workout_relationship = Workout_Activity(workout_id=cloned_workout.id,activity_id=cloned_activity.id)
-        db.session.add(workout_relationship)
-        db.session.commit()
     return redirect(f"/workouts/{cloned_workout.id}/edit")
 
 @app.route('/workouts/<int:workout_id>/edit')
@@ -214,7 +313,9 @@ def delete_workout(workout_id):
     """Allows a user to delete their workout."""
     workout = Workout.query.get_or_404(workout_id)
     if g.user.id == workout.creator:
+        affected_stats = workout_pairs([workout.id])
         db.session.delete(workout)
+        refresh_exercise_stats(affected_stats)
         db.session.commit()
         if request.referrer: #Redirect to the page the user made the delete request from, if it still exists
             if f'workouts/{workout_id}' in request.referrer:
@@ -230,14 +331,18 @@ def delete_workout(workout_id):
 @app.route('/users/<int:user_id>/logs')
 @redirect_if_logged_out
 def show_logs(user_id):
-    """Allows a user to view their logged workouts"""
+    """Allows a user to view a page of their logged workouts, newest first"""
     user = User.query.get_or_404(user_id)
     if g.user.id == user_id:
-        logged_workouts = []
-        for workout in user.workouts:
-            if workout.is_logged:
-                logged_workouts.append(workout)
-        return render_template('Log/logs.html',workouts=logged_workouts)
+        logged_workouts = Workout.query.filter_by(creator=user.id, is_logged=True)
+        try:
+            logged_workouts, next_cursor = keyset_page(logged_workouts, Workout.datetime, Workout.id,
+                            after=request.args.get('after'),
+                            limit=WORKOUTS_PAGE_SIZE,
+                            descending=True)
+        except ValueError:
+            abort(400)
+        return render_template('Log/logs.html',workouts=logged_workouts,cards=Workout.load_cards(logged_workouts),next_cursor=next_cursor)
     else:
         flash(unauthorized_access_message)
         return redirect('/')
@@ -284,6 +389,7 @@ def toggle_log(workout_id):
     if g.user.id == workout.creator:
         workout.is_logged = not workout.is_logged
         db.session.add(workout)
+        refresh_exercise_stats(workout_pairs([workout.id]))
         db.session.commit()
         serialized_workout = workout.serialize()
         response_json =  jsonify(workout=serialized_workout)  
@@ -298,12 +404,7 @@ def toggle_log(workout_id):
 def get_workout(workout_id):
     """API for a user to get a workout's activities."""
     workout = Workout.query.get_or_404(workout_id)
-    all_activities = workout.workout_activities.order_by(Activity.datetime.desc())
-    serialized_activities = [
-        activity.serialize() for activity in all_activities]
-    for serialized_activity in serialized_activities:
-        exercise = Exercise.query.get(int(serialized_activity['exercise']))
-        serialized_activity['exercise'] = exercise.name
+    serialized_activities = workout.serialize_activities()
     return jsonify(activities=serialized_activities)
 
 @app.route('/api/workouts/<int:workout_id>/activities', methods=['POST'])
@@ -313,17 +414,19 @@ def create_activity(workout_id):
     workout = Workout.query.get_or_404(workout_id)
     if g.user.id == workout.creator:
         exercise_name = request.json['exercise']
-        exercise = Exercise.query.filter_by(name=exercise_name).first()
+        exercise = exercise_or_404(exercise_name)
         sets = request.json.get('sets',None) if request.json.get('sets',None) != "" else None
         reps = request.json.get('reps',None) if request.json.get('reps',None) != "" else None
         weight = request.json.get('weight',None) if request.json.get('weight',None) != "" else None
         duration = request.json.get('duration',None) if request.json.get('duration',None) != "" else None
         distance = request.json.get('distance',None)if request.json.get('distance',None) != "" else None
-        new_activity = Activity(performed_by=g.user.id,exercise_id=exercise.id,sets=sets,reps=reps,weight=weight,duration=duration,distance=distance)
+        new_activity = Activity(performed_by=g.user.id,exercise_id=exercise['id'],sets=sets,reps=reps,weight=weight,duration=duration,distance=distance)
         db.session.add(new_activity)
-        db.session.commit()
+        db.session.flush()
         new_relation = Workout_Activity(activity_id=new_activity.id, workout_id=workout_id)
         db.session.add(new_relation)
+        if workout.is_logged:
+            refresh_exercise_stats({(workout.creator, exercise['id'])})
         db.session.commit()
         serialized_activity = new_activity.serialize()
         serialized_activity['exercise'] = exercise_name
@@ -333,38 +436,65 @@ def create_activity(workout_id):
         response_json = {'response': unauthorized_edit_message}
         return (response_json,401)
 
-@app.route('/api/activities/<int:activity_id>/update', methods=['POST'])
+@app.route('/api/workouts/<int:workout_id>/activities/batch', methods=['POST'])
 @error_response_if_logged_out
-def update_activity(activity_id):
-    """API for a user to update an activity."""
-    activity = Activity.query.get_or_404(activity_id)
-    if g.user.id == activity.performed_by:    
-        for key,value in request.json.items():
-            if value == "":
-                setattr(activity,key,None)
-            elif key == 'exercise':
-                exercise = Exercise.query.filter_by(name=value).first()
-                setattr(activity,'exercise_id',exercise.id)
-            else:
-                setattr(activity,key,value)
-        db.session.add(activity)
-        db.session.commit()
-        activity = Activity.query.get_or_404(activity_id)
-        serialized_activity = activity.serialize()
-        serialized_activity['exercise'] = activity.exercise.name
-        response_json = jsonify(activity=serialized_activity)
-        return (response_json,201)
+def batch_activities(workout_id):
+    """API for a user to create, update and delete many of a workout's activities at once.
+
+    Expects {"operations": [{"op": "create", "exercise": ..., "sets": ...}, {"op": "update", "id": ..., ...}, {"op": "delete", "id": ...}]}.
+    Either every operation is applied or, if any is invalid, none are.
+    """
+    workout = Workout.query.get_or_404(workout_id)
+    if g.user.id == workout.creator:
+        try:
+            created_ids = apply_activity_batch(workout, g.user.id, (request.get_json(silent=True) or {}).get('operations'))
+        except BatchError as error:
+            response_json = {'response': str(error)}
+            return (response_json,400)
+        serialized_activities = workout.serialize_activities()
+        response_json = jsonify(activities=serialized_activities, created=created_ids)
+        return (response_json,200)
     else:
         response_json = {'response': unauthorized_edit_message}
         return (response_json,401)
 
+@app.route('/api/activities/<int:activity_id>/update', methods=['POST', 'PATCH'])
+@error_response_if_logged_out
+def update_activity(activity_id):
+    """API for a user to change some of an activity's fields: exercise (by name), sets, reps, weight, duration, distance or units.
+
+    Fields not given are left as they are; unknown fields are rejected.  The activity is updated and returned by one statement.
+    """
+    changes = request.get_json(silent=True)
+    if not isinstance(changes, dict):
+        response_json = {'response': invalid_query_message}
+        return (response_json,400)
+    exercise_name = changes.get('exercise')
+    exercise_id = exercise_or_404(exercise_name)['id'] if exercise_name else None
+    try:
+        serialized_activity = update_activity_values(activity_id, g.user.id,
+                            clean_values({key: value for key, value in changes.items() if key != 'exercise'}),
+                            exercise_id=exercise_id)
+    except BatchError as error:
+        response_json = {'response': str(error)}
+        return (response_json,400)
+    if serialized_activity is None:
+        Activity.query.get_or_404(activity_id)
+        response_json = {'response': unauthorized_edit_message}
+        return (response_json,401)
+    db.session.commit()
+    response_json = jsonify(activity=serialized_activity)
+    return (response_json,201)
+
 @app.route('/api/activities/<int:activity_id>/delete')
 @error_response_if_logged_out
 def delete_activity(activity_id):
     """API for a user to delete an activity."""
     activity = Activity.query.get_or_404(activity_id)
     if g.user.id == activity.performed_by: 
+        affected_stats = activity_pairs([activity_id])
         db.session.delete(activity)
+        refresh_exercise_stats(affected_stats)
         db.session.commit()
         response_json = {'response': "Resource successfully deleted"}
         return (response_json,200)
@@ -372,57 +502,123 @@ def delete_activity(activity_id):
         response_json = {'response': unauthorized_edit_message}
         return (response_json,401)
 
+@app.route('/metrics')
+def show_metrics():
+    """Expose request, connection pool, cache and password hashing metrics in the Prometheus text format"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
 # API Routes for Exercises
 @app.route('/api/exercises')
 def get_exercises():
-    """API to get all exercises in the database."""
-    exercises = Exercise.query.all()
-    serialized_exercises = [
-        exercise.serialize() for exercise in exercises
-    ]
-    return jsonify(exercises=serialized_exercises)
+    """API to get all exercises in the database, served from the in-process catalog cache."""
+    catalog = exercise_catalog.get()
+    response = app.response_class(catalog.body, mimetype='application/json')
+    response.set_etag(catalog.etag)
+    response.last_modified = catalog.last_modified
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/exercises/search')
+def search_exercises():
+    """API to autocomplete exercise names: returns the best matches for the words typed in 'q', from the in-process catalog.
+
+    Accepts an optional 'limit' (default 10, at most 50).
+    """
+    limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+    if limit < 1:
+        response_json = {'response': invalid_query_message}
+        return (response_json,400)
+    matches = exercise_catalog.get().index.search(request.args.get('q', ''), min(limit, MAX_SEARCH_LIMIT))
+    return jsonify(exercises=matches)
 
 @app.route('/api/exercises/<exercise_name>')
 def get_exercise_info(exercise_name):
     """API to retrieve a specific exercise."""
-    exercise = Exercise.query.filter_by(name=exercise_name).first()
-    serialized_exercise = exercise.serialize()
+    serialized_exercise = exercise_or_404(exercise_name)
     return jsonify(exercise=serialized_exercise)
 
+@app.route('/api/exercises/<int:exercise_id>/info')
+def get_exercise_details(exercise_id):
+    """API to retrieve an exercise's description, muscles and equipment from the wger API, through a local cache."""
+    if exercise_catalog.find_by_id(exercise_id) is None:
+        abort(404)
+    try:
+        details = exercise_info_cache.get(exercise_id)
+    except requests.RequestException:
+        response_json = {'response': exercise_info_unavailable_message}
+        return (response_json,502)
+    return jsonify(details)
+
 #API Routes for Logs
 @app.route('/api/users/logs/<exercise_name>')
 @error_response_if_logged_out
 def show_exercise_logs(exercise_name):
-    """API to retrieve a user's logs for a specific exercise."""
-    user = User.query.get(g.user.id)
-    exercise = Exercise.query.filter_by(name=exercise_name).first()
-    logged_stats = []
-    for workout in user.workouts:
-        if workout.is_logged:
-            for activity in workout.workout_activities:
-                if activity.exercise_id == exercise.id:
-                    logged_stats.append({
-                        'datetime': activity.datetime,
-                        "weight": activity.weight,
-                        "sets": activity.sets,
-                        "reps": activity.reps,
-                        "duration": activity.duration,
-                        "distance": activity.distance
-                        })
-    response_json = jsonify(stats=logged_stats)
+    """API to retrieve a page of a user's logs for a specific exercise.
+
+    Accepts optional 'since'/'until' dates (YYYY-MM-DD), an 'after' cursor from a previous page, and a 'limit'.
+    """
+    exercise = exercise_or_404(exercise_name)
+    try:
+        since = parse_date(request.args.get('since'))
+        until = parse_date(request.args.get('until'))
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        logged_stats, next_cursor = exercise_history(g.user.id, exercise['id'],
+                            since=since,
+                            until=until,
+                            after=request.args.get('after'),
+                            limit=limit)
+    except ValueError:
+        response_json = {'response': invalid_query_message}
+        return (response_json,400)
+    response_json = jsonify(stats=logged_stats, next=next_cursor)
     return (response_json,201)
 
 @app.route('/api/users/logs/<exercise_name>/<stat_name>')
 @error_response_if_logged_out
 def show_exercise_stat_logs(exercise_name,stat_name):
-    """API to retrieve a user's logs for a specific exercise and specific stat."""
-    user = User.query.get(g.user.id)
-    exercise = Exercise.query.filter_by(name=exercise_name).first()
-    logged_stats = []
-    for workout in user.workouts:
-        if workout.is_logged:
-            for activity in workout.workout_activities:
-                if activity.exercise_id == exercise.id:
-                    logged_stats.append({'datetime': activity.datetime, "stat": activity.weight})
+    """API to retrieve a user's max, sum and average of a stat for a specific exercise, bucketed by time.
+
+    stat_name is one of weight, reps, sets, duration, distance or volume (sets x reps x weight).
+    Accepts an optional 'bucket' of day (default), week or month and optional 'since'/'until' dates (YYYY-MM-DD).
+    """
+    exercise = exercise_or_404(exercise_name)
+    try:
+        logged_stats = stat_aggregates(g.user.id, exercise['id'], stat_name,
+                            bucket=request.args.get('bucket', 'day'),
+                            since=parse_date(request.args.get('since')),
+                            until=parse_date(request.args.get('until')))
+    except ValueError:
+        response_json = {'response': invalid_query_message}
+        return (response_json,400)
     response_json = jsonify(stats=logged_stats)
     return (response_json,201)
+
+@app.route('/api/users/analytics/<exercise_name>')
+@error_response_if_logged_out
+def show_exercise_analytics(exercise_name):
+    """API to retrieve a user's trends for an exercise: per-session bests with rolling averages, weekly volume and
+    the estimated one-rep max progression per week.
+
+    Accepts an optional 'window', the number of sessions in each rolling average (default 4).
+    """
+    exercise = exercise_or_404(exercise_name)
+    try:
+        analytics = analytics_cache.get(g.user.id, exercise['id'], int(request.args.get('window', DEFAULT_WINDOW)))
+    except ValueError:
+        response_json = {'response': invalid_query_message}
+        return (response_json,400)
+    response_json = jsonify(analytics=analytics)
+    return (response_json,201)
+
+@app.route('/api/users/summary/<exercise_name>')
+@error_response_if_logged_out
+def show_exercise_summary(exercise_name):
+    """API to retrieve a user's all-time summary for an exercise: first and last performed, sessions, bests and totals.
+
+    The summary is kept up to date as activities and logged workouts change, so it is read with one primary key lookup.
+    """
+    exercise = exercise_or_404(exercise_name)
+    summary = User_Exercise_Stats.query.get((g.user.id, exercise['id']))
+    response_json = jsonify(summary=summary.serialize() if summary else None)
+    return (response_json,201)
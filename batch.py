@@ -0,0 +1,155 @@
+from sqlalchemy import bindparam
+
+from catalog import exercise_catalog
+from exercise_stats import refresh_exercise_stats, activity_pairs
+from models import db, Activity, Exercise, Workout_Activity
+
+ACTIVITY_FIELDS = ('sets', 'reps', 'weight', 'weight_units', 'duration', 'duration_units', 'distance', 'distance_units')
+INTEGER_FIELDS = ('sets', 'reps', 'weight', 'duration')
+OPERATIONS = ('create', 'update', 'delete')
+
+activities = Activity.__table__
+exercises = Exercise.__table__
+workout_activities = Workout_Activity.__table__
+
+class BatchError(ValueError):
+    """Raised when a batch of activity operations is invalid; nothing from the batch is applied"""
+
+def clean_values(fields, context=""):
+    """Returns the activity columns to set from request fields, with "" treated as None and integer stats checked.
+
+    context prefixes error messages, to say which operation of a batch was invalid.
+    """
+    values = {}
+    for key, value in fields.items():
+        if key not in ACTIVITY_FIELDS:
+            raise BatchError(f"{context}unknown field '{key}'")
+        if value == "":
+            value = None
+        elif value is not None and key in INTEGER_FIELDS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise BatchError(f"{context}'{key}' must be a whole number")
+        values[key] = value
+    return values
+
+def operation_values(index, operation):
+    """Returns the activity columns a batch operation sets"""
+    return clean_values({key: value for key, value in operation.items() if key not in ('op', 'id', 'exercise')},
+                        f"Operation {index}: ")
+
+def parse_operations(operations):
+    """Splits a list of operations into creates, updates and deletes, checking each is well formed"""
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("'operations' must be a non-empty list")
+    creates, updates, deletes = [], {}, set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise BatchError(f"Operation {index}: 'op' must be one of {', '.join(OPERATIONS)}")
+        if operation['op'] == 'create':
+            if not operation.get('exercise'):
+                raise BatchError(f"Operation {index}: an exercise is required")
+            creates.append((operation['exercise'], operation_values(index, operation)))
+            continue
+        activity_id = operation.get('id')
+        if not isinstance(activity_id, int) or activity_id in updates or activity_id in deletes:
+            raise BatchError(f"Operation {index}: 'id' must be an activity id not used by another operation")
+        if operation['op'] == 'update':
+            updates[activity_id] = (operation.get('exercise'), operation_values(index, operation))
+        else:
+            deletes.add(activity_id)
+    return creates, updates, deletes
+
+def update_activity_values(activity_id, user_id, values, exercise_id=None):
+    """Applies cleaned values (and a new exercise, if given) to one of a user's activities with a single UPDATE ... RETURNING.
+
+    The statement joins the activity's exercise, so it returns the serialized activity, exercise name included, without
+    reloading it.  The summaries for the activity's old and new exercise are recomputed in the same transaction.
+    Returns None, changing nothing, if the user has no activity with that id.
+    """
+    if exercise_id is not None:
+        values = dict(values, exercise_id=exercise_id)
+    if not values:
+        raise BatchError("Nothing to update")
+    affected_stats = activity_pairs([activity_id])
+    # The join sees the row as it was before the update, so a new exercise is joined by its id
+    joined_exercise_id = activities.c.exercise_id if exercise_id is None else exercise_id
+    row = db.session.execute(activities.update()
+                    .where(activities.c.id == activity_id,
+                           activities.c.performed_by == user_id,
+                           exercises.c.id == joined_exercise_id)
+                    .values(values)
+                    .returning(activities.c.id,
+                               exercises.c.name.label('exercise'),
+                               activities.c.sets,
+                               activities.c.reps,
+                               activities.c.weight,
+                               activities.c.duration,
+                               activities.c.distance)).first()
+    if row is None:
+        return None
+    if exercise_id is not None:
+        affected_stats |= {(creator, exercise_id) for creator, previous_exercise_id in affected_stats}
+    refresh_exercise_stats(affected_stats)
+    return dict(row._mapping)
+
+def apply_activity_batch(workout, user_id, operations):
+    """Validates a list of create/update/delete operations on a workout's activities and applies them in one transaction.
+
+    Exercise names are resolved from the in-process catalog and each kind of operation is applied with bulk statements.
+    The creator's summaries for every exercise the batch touches are then recomputed in the same transaction.
+    Returns the ids of the created activities, in the order they were given.
+    """
+    creates, updates, deletes = parse_operations(operations)
+
+    exercise_names = {name for name, values in creates} | {name for name, values in updates.values() if name}
+    resolved = {name: exercise_catalog.find(name) for name in exercise_names}
+    exercise_ids = {name: exercise['id'] for name, exercise in resolved.items() if exercise is not None}
+    unknown_exercises = exercise_names - set(exercise_ids)
+    if unknown_exercises:
+        raise BatchError(f"Unknown exercise(s): {', '.join(sorted(unknown_exercises))}")
+
+    activity_ids = set(updates) | deletes
+    current_exercise_ids = dict(db.session.query(Workout_Activity.activity_id, Activity.exercise_id)
+                    .join(Activity, Activity.id == Workout_Activity.activity_id)
+                    .filter(Workout_Activity.workout_id == workout.id, Workout_Activity.activity_id.in_(activity_ids)))
+    workout_activity_ids = set(current_exercise_ids)
+    if activity_ids - workout_activity_ids:
+        raise BatchError(f"Activities not in this workout: {', '.join(map(str, sorted(activity_ids - workout_activity_ids)))}")
+
+    try:
+        if deletes:
+            db.session.execute(workout_activities.delete().where(workout_activities.c.activity_id.in_(deletes)))
+            db.session.execute(activities.delete().where(activities.c.id.in_(deletes)))
+
+        updates_by_columns = {}
+        for activity_id, (exercise_name, values) in updates.items():
+            if exercise_name:
+                values['exercise_id'] = exercise_ids[exercise_name]
+            if values:
+                row = {f"new_{column}": value for column, value in values.items()}
+                row['activity_id'] = activity_id
+                updates_by_columns.setdefault(tuple(sorted(values)), []).append(row)
+        for columns, rows in updates_by_columns.items():
+            db.session.execute(activities.update()
+                        .where(activities.c.id == bindparam('activity_id'))
+                        .values({column: bindparam(f"new_{column}") for column in columns}),
+                        rows)
+
+        created_ids = []
+        if creates:
+            rows = [dict({field: values.get(field) for field in ACTIVITY_FIELDS},
+                        performed_by=user_id,
+                        exercise_id=exercise_ids[exercise_name]) for exercise_name, values in creates]
+            created_ids = [row.id for row in db.session.execute(activities.insert().values(rows).returning(activities.c.id))]
+            db.session.execute(workout_activities.insert().values(
+                        [{'workout_id': workout.id, 'activity_id': activity_id} for activity_id in created_ids]))
+        if workout.is_logged:
+            affected_exercise_ids = set(current_exercise_ids.values()) | {exercise_ids[name] for name in exercise_names}
+            refresh_exercise_stats({(workout.creator, exercise_id) for exercise_id in affected_exercise_ids})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return created_ids
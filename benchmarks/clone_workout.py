@@ -0,0 +1,77 @@
+"""Measures how long cloning a workout takes, and how many SQL statements it issues, as the workout grows.
+
+    DATABASE_URL=postgresql:///workoutcompanion-bench python -m benchmarks.clone_workout
+
+Creates its own user, exercise and workouts, and removes them when done.
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import event
+
+from app import app, USER_KEY
+from models import db, User, Exercise, Activity, Workout, Workout_Activity
+
+def create_workout(user_id, exercise_id, size):
+    """Creates a workout with the given number of activities and returns its id"""
+    workout = Workout(creator=user_id, name=f"Clone benchmark {size}", is_private=False)
+    db.session.add(workout)
+    activities = [Activity(performed_by=user_id, exercise_id=exercise_id, sets=3, reps=10, weight=n) for n in range(size)]
+    db.session.add_all(activities)
+    db.session.flush()
+    db.session.add_all([Workout_Activity(workout_id=workout.id, activity_id=activity.id) for activity in activities])
+    db.session.commit()
+    return workout.id
+
+def time_clones(client, workout_id, repeat):
+    """Clones the workout repeatedly and returns the latencies in milliseconds and the statements per clone"""
+    statements = []
+    latencies = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.get(f'/workouts/{workout_id}/clone')
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return latencies, len(statements) // repeat
+
+def remove_benchmark_data(user_id):
+    """Deletes everything the benchmark user created"""
+    workout_ids = db.session.query(Workout.id).filter(Workout.creator == user_id)
+    Workout_Activity.query.filter(Workout_Activity.workout_id.in_(workout_ids)).delete(synchronize_session=False)
+    Workout.query.filter_by(creator=user_id).delete()
+    Activity.query.filter_by(performed_by=user_id).delete()
+    User.query.filter_by(id=user_id).delete()
+    db.session.commit()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark /workouts/<id>/clone against workout size.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    user = User(username=f"clone-benchmark-{time.time_ns()}", email=f"clone-benchmark-{time.time_ns()}@example.com", password="unused")
+    exercise = Exercise.query.first() or Exercise(name="Clone Benchmark Exercise", type="Strength")
+    db.session.add_all([user, exercise])
+    db.session.commit()
+    user_id, exercise_id = user.id, exercise.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess[USER_KEY] = user_id
+    try:
+        print(f"{'activities':>10} {'p50 ms':>8} {'p99 ms':>8} {'statements':>10}")
+        for size in args.sizes:
+            workout_id = create_workout(user_id, exercise_id, size)
+            latencies, statement_count = time_clones(client, workout_id, args.repeat)
+            p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+            print(f"{size:>10} {statistics.median(latencies):>8.2f} {p99:>8.2f} {statement_count:>10}")
+    finally:
+        remove_benchmark_data(user_id)
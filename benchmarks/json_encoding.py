@@ -0,0 +1,54 @@
+"""Compares the time to encode a large log response with flask.jsonify and with fast_json.
+
+    DATABASE_URL=postgresql:///workoutcompanion-bench python -m benchmarks.json_encoding --rows 10000
+
+Loads --rows activities with the columns of GET /api/users/logs/<exercise> once, then times building the response
+body from the result rows both ways: the old path (a dict per row from its mapping, then flask.jsonify) and the new
+one (fast_json.records, then fast_json.jsonify).  Only encoding is timed, not the query.
+"""
+import argparse
+import statistics
+import time
+
+from flask import jsonify as flask_jsonify
+
+from app import app
+from fast_json import jsonify, records
+from models import db, Activity
+
+def load_rows(count):
+    """Returns up to count activity rows with the columns the log route returns"""
+    return (db.session.query(Activity.id, Activity.datetime, Activity.weight, Activity.sets,
+                            Activity.reps, Activity.duration, Activity.distance)
+                    .order_by(Activity.id)
+                    .limit(count)
+                    .all())
+
+def time_encoder(encode, rows, repeat):
+    """Runs encode(rows) repeat times after one warm up; returns the times in milliseconds and the body size"""
+    size = len(encode(rows).get_data())
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(rows)
+        times.append((time.perf_counter() - start) * 1000)
+    return times, size
+
+ENCODERS = {
+    'flask.jsonify': lambda rows: flask_jsonify(stats=[dict(row._mapping) for row in rows], next=None),
+    'fast_json': lambda rows: jsonify(stats=records(rows), next=None),
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare JSON encoding time for a large log response.")
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.test_request_context():
+        rows = load_rows(args.rows)
+        print(f"rows={len(rows)} repeat={args.repeat}")
+        print(f"{'encoder':<14} {'median ms':>10} {'min ms':>8} {'KB':>8}")
+        for name, encode in ENCODERS.items():
+            times, size = time_encoder(encode, rows, args.repeat)
+            print(f"{name:<14} {statistics.median(times):>10.2f} {min(times):>8.2f} {size / 1024:>8.1f}")
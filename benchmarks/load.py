@@ -0,0 +1,99 @@
+"""Load tests the app under gunicorn with each runtime profile and reports throughput and latency.
+
+    DATABASE_URL=postgresql:///workoutcompanion-bench python -m benchmarks.load --profiles sync gthread gevent --clients 16
+
+Starts gunicorn (with gunicorn.conf.py) once per profile, then has --clients threads request the read routes from
+benchmarks.routes in turn, logged in as the user with the most workouts, for --seconds.  Load the database with
+datagen.py first.  The load generator runs on the same machine, so compare profiles with each other rather
+than reading the numbers as capacity.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import threading
+import time
+
+import requests
+
+from app import app, USER_KEY
+from benchmarks.routes import sample_routes, percentile
+
+PROFILES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread'},
+    'gevent': {'GUNICORN_WORKER_CLASS': 'gevent'},
+}
+
+def session_cookie(user_id):
+    """Returns a signed session cookie logging in the given user"""
+    return app.session_interface.get_signing_serializer(app).dumps({USER_KEY: user_id})
+
+def start_server(profile, port, workers):
+    """Starts gunicorn with a profile and waits until it answers"""
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), **PROFILES[profile])
+    server = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'app:app'],
+                    env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"gunicorn did not start with the {profile} profile")
+
+def run_load(base_url, urls, cookie, clients, seconds):
+    """Requests the urls from several threads for the given time; returns latencies in milliseconds and the error count"""
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + seconds
+
+    def client(offset):
+        with requests.Session() as http:
+            http.cookies.set('session', cookie)
+            n = offset
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    resp = http.get(base_url + urls[n % len(urls)], timeout=30)
+                    ok = resp.status_code < 400
+                except requests.RequestException:
+                    ok = False
+                (latencies if ok else errors).append((time.perf_counter() - start) * 1000)
+                n += 1
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the app under gunicorn with each runtime profile.")
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=['sync', 'gthread'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    user_id, routes = sample_routes()
+    urls = list(routes.values())
+    cookie = session_cookie(user_id)
+    print(f"workers={args.workers} clients={args.clients} seconds={args.seconds}")
+    print(f"{'profile':<8} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for profile in args.profiles:
+        server = start_server(profile, args.port, args.workers)
+        try:
+            latencies, errors = run_load(f'http://127.0.0.1:{args.port}', urls, cookie, args.clients, args.seconds)
+        finally:
+            server.terminate()
+            server.wait()
+        if not latencies:
+            print(f"{profile:<8} {0:>8.1f} {errors:>7}")
+            continue
+        print(f"{profile:<8} {len(latencies) / args.seconds:>8.1f} {errors:>7} "
+              f"{statistics.median(latencies):>8.2f} {percentile(latencies, 99):>8.2f}")
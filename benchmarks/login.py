@@ -0,0 +1,71 @@
+"""Measures logins per second for one app process at different bcrypt work factors.
+
+    DATABASE_URL=postgresql:///workoutcompanion-bench python -m benchmarks.login --rounds 10 11 12 --threads 8
+
+Each thread plays a gunicorn request thread posting to /login; logins beyond the hashing pool's queue depth
+are answered with 503 and counted as shed.  Creates its own user and removes it when done.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from app import app
+from models import db, User
+from passwords import password_hasher
+
+def run_logins(username, password, threads, seconds):
+    """Posts logins from several threads for the given time; returns latencies in milliseconds of the successful ones and the shed count"""
+    latencies = []
+    shed = []
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            resp = client.post('/login', data={'username': username, 'password': password})
+            elapsed = (time.perf_counter() - start) * 1000
+            if resp.status_code == 503:
+                shed.append(elapsed)
+            else:
+                latencies.append(elapsed)
+            client.get('/logout')
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, len(shed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark /login throughput against the bcrypt work factor.")
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    username, password = f"login-benchmark-{time.time_ns()}", "benchmark-password"
+    user = User.signup(username, f"{username}@example.com", password)
+    user_id = user.id
+    try:
+        print(f"workers={app.config['PASSWORD_HASH_WORKERS']} queue depth={app.config['PASSWORD_HASH_QUEUE_DEPTH']} threads={args.threads}")
+        print(f"{'rounds':>6} {'logins/s':>9} {'shed/s':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for rounds in args.rounds:
+            password_hasher.configure(rounds=rounds,
+                        workers=app.config['PASSWORD_HASH_WORKERS'],
+                        queue_depth=app.config['PASSWORD_HASH_QUEUE_DEPTH'])
+            User.query.filter_by(id=user_id).update({'password': password_hasher.hash(password)})
+            db.session.commit()
+            latencies, shed = run_logins(username, password, args.threads, args.seconds)
+            if not latencies:
+                print(f"{rounds:>6} {0:>9.1f} {shed / args.seconds:>7.1f} {'-':>8} {'-':>8}")
+                continue
+            p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+            print(f"{rounds:>6} {len(latencies) / args.seconds:>9.1f} {shed / args.seconds:>7.1f} "
+                  f"{statistics.median(latencies):>8.2f} {p99:>8.2f}")
+    finally:
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
@@ -0,0 +1,222 @@
+"""Times every route against the data in the database and reports p50/p99 latency and SQL statements per request.
+
+    DATABASE_URL=postgresql:///workoutcompanion-bench python -m benchmarks.routes --generate --reset --users 10000 --output before.json
+    DATABASE_URL=postgresql:///workoutcompanion-bench python -m benchmarks.routes --output after.json
+    python -m benchmarks.routes --compare before.json after.json
+
+Routes are requested in process through the test client, as the user with the most workouts, so the numbers are
+server time without the network.  Write routes act on throwaway rows: a copy of that user's newest workout, and
+activities and workouts made for each request that needs one (untimed, and not counted in the statements).  Every row the
+run adds is deleted, and the user's summaries refreshed, when it ends.  --generate first fills the database with
+datagen.py (taking the same size options), otherwise the data already there is used.  Results are written as JSON along
+with the row counts they were measured at.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app import app, USER_KEY, WORKOUTS_PAGE_SIZE
+from datagen import add_arguments, generate_from_args
+from exercise_stats import refresh_exercise_stats, activity_pairs
+from models import db, User, Exercise, Activity, Workout, Workout_Activity
+from pagination import encode_cursor
+
+def newest_workouts(user_id):
+    """Returns a query for the user's workouts, newest first"""
+    return Workout.query.filter_by(creator=user_id).order_by(Workout.datetime.desc(), Workout.id.desc())
+
+def top_exercise(user_id):
+    """Returns the exercise the user has done most often"""
+    exercise_id, = (db.session.query(Activity.exercise_id)
+                    .filter(Activity.performed_by == user_id)
+                    .group_by(Activity.exercise_id)
+                    .order_by(db.func.count(Activity.id).desc())
+                    .first())
+    return Exercise.query.get(exercise_id)
+
+def sample_routes():
+    """Returns a user id and the routes to time, by name, filled in from the user with the most workouts"""
+    user_id, = (db.session.query(Workout.creator)
+                    .group_by(Workout.creator)
+                    .order_by(db.func.count(Workout.id).desc())
+                    .first())
+    newest = newest_workouts(user_id)
+    workout = newest.first()
+    page_end = newest.offset(WORKOUTS_PAGE_SIZE - 1).first() or workout
+    exercise_name = top_exercise(user_id).name
+    return user_id, {
+        'GET /workouts': '/workouts',
+        'GET /users/<id>/workouts': f'/users/{user_id}/workouts',
+        'GET /users/<id>/workouts?after': f'/users/{user_id}/workouts?after={encode_cursor(page_end.datetime, page_end.id)}',
+        'GET /users/<id>/logs': f'/users/{user_id}/logs',
+        'GET /workouts/<id>': f'/workouts/{workout.id}',
+        'GET /workouts/<id>/edit': f'/workouts/{workout.id}/edit',
+        'GET /api/workouts/<id>/activities': f'/api/workouts/{workout.id}/activities',
+        'GET /api/exercises': '/api/exercises',
+        'GET /api/exercises/search': f'/api/exercises/search?q={exercise_name.split()[0][:3]}',
+        'GET /api/users/logs/<exercise>': f'/api/users/logs/{exercise_name}',
+        'GET /api/users/logs/<exercise>/<stat>': f'/api/users/logs/{exercise_name}/weight?bucket=week',
+        'GET /api/users/analytics/<exercise>': f'/api/users/analytics/{exercise_name}',
+    }
+
+def add_scratch_activity(workout_id, user_id, exercise_id):
+    """Adds an activity to a workout, for a write route to act on, and returns its id"""
+    activity = Activity(performed_by=user_id, exercise_id=exercise_id, weight=100, reps=5, sets=3)
+    db.session.add(activity)
+    db.session.flush()
+    db.session.add(Workout_Activity(workout_id=workout_id, activity_id=activity.id))
+    db.session.commit()
+    return activity.id
+
+def add_scratch_workout(workout_id, user_id):
+    """Copies a workout, with its activities, to the user and returns the copy's id"""
+    scratch_id = Workout.query.get(workout_id).clone(user_id).id
+    db.session.commit()
+    return scratch_id
+
+def write_routes(user_id):
+    """Returns the write routes to time, by name, as functions preparing the throwaway rows for one request and returning its method, url and JSON body"""
+    workout_id = newest_workouts(user_id).first().id
+    exercise = top_exercise(user_id)
+    exercise_id, exercise_name = exercise.id, exercise.name
+    scratch_id = add_scratch_workout(workout_id, user_id)
+    activity_id = add_scratch_activity(scratch_id, user_id, exercise_id)
+    stats = {'sets': 4, 'reps': 8, 'weight': 135}
+    return {
+        'POST /api/workouts/<id>/activities': lambda: ('POST', f'/api/workouts/{scratch_id}/activities', dict(stats, exercise=exercise_name)),
+        'PATCH /api/activities/<id>/update': lambda: ('PATCH', f'/api/activities/{activity_id}/update', {'weight': 140}),
+        'POST /api/workouts/<id>/activities/batch': lambda: ('POST', f'/api/workouts/{scratch_id}/activities/batch', {'operations': [
+                            {'op': 'update', 'id': activity_id, 'reps': 6},
+                            {'op': 'create', 'exercise': exercise_name, **stats},
+                            {'op': 'delete', 'id': add_scratch_activity(scratch_id, user_id, exercise_id)}]}),
+        'GET /api/activities/<id>/delete': lambda: ('GET', f'/api/activities/{add_scratch_activity(scratch_id, user_id, exercise_id)}/delete', None),
+        'POST /api/workouts/<id>/edit': lambda: ('POST', f'/api/workouts/{scratch_id}/edit', {'name': "Benchmark Workout"}),
+        'GET /api/workouts/<id>/share': lambda: ('GET', f'/api/workouts/{scratch_id}/share', None),
+        'GET /api/workouts/<id>/log': lambda: ('GET', f'/api/workouts/{scratch_id}/log', None),
+        'GET /workouts/new': lambda: ('GET', '/workouts/new', None),
+        'GET /workouts/<id>/clone': lambda: ('GET', f'/workouts/{workout_id}/clone', None),
+        'GET /workouts/<id>/delete': lambda: ('GET', f'/workouts/{add_scratch_workout(workout_id, user_id)}/delete', None),
+    }
+
+def remove_written_rows(user_id, last_workout_id, last_activity_id):
+    """Deletes the user's workouts and activities added since the given ids, and refreshes the summaries they touched"""
+    activity_ids = [activity_id for activity_id, in db.session.query(Activity.id)
+                    .filter(Activity.performed_by == user_id, Activity.id > last_activity_id)]
+    affected_stats = activity_pairs(activity_ids)
+    Workout_Activity.query.filter(Workout_Activity.activity_id.in_(activity_ids)).delete(synchronize_session=False)
+    Activity.query.filter(Activity.id.in_(activity_ids)).delete(synchronize_session=False)
+    Workout.query.filter(Workout.creator == user_id, Workout.id > last_workout_id).delete(synchronize_session=False)
+    refresh_exercise_stats(affected_stats)
+    db.session.commit()
+
+def request_for(route):
+    """Returns the method, url and JSON body for a route: a read route's url, or what a write route prepares"""
+    return route() if callable(route) else ('GET', route, None)
+
+def time_route(client, route, repeat):
+    """Requests a route repeat times after one warm up request; returns latencies in milliseconds, statements per request, the status and the last url"""
+    statements = []
+    recording = [False]
+
+    def record(conn, cursor, statement, *args):
+        if recording[0]:
+            statements.append(statement)
+
+    method, url, body = request_for(route)
+    status = client.open(url, method=method, json=body).status_code
+    latencies = []
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for _ in range(repeat):
+            method, url, body = request_for(route)
+            recording[0] = True
+            start = time.perf_counter()
+            client.open(url, method=method, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recording[0] = False
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return latencies, len(statements) / repeat, status, url
+
+def percentile(latencies, n):
+    """Returns the nth percentile of a list of latencies"""
+    return statistics.quantiles(latencies, n=100)[n - 1] if len(latencies) > 1 else latencies[0]
+
+def git_revision():
+    """Returns the commit being benchmarked, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(repeat, generated=None):
+    """Times every route and returns the results, with the dataset size (and generation options) they were measured at"""
+    user_id, routes = sample_routes()
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess[USER_KEY] = user_id
+    results = {}
+    last_workout_id, = db.session.query(db.func.max(Workout.id)).one()
+    last_activity_id, = db.session.query(db.func.max(Activity.id)).one()
+    try:
+        routes.update(write_routes(user_id))
+        for name, route in routes.items():
+            latencies, statements, status, url = time_route(client, route, repeat)
+            results[name] = {'url': url, 'status': status,
+                        'p50_ms': round(statistics.median(latencies), 3),
+                        'p99_ms': round(percentile(latencies, 99), 3),
+                        'statements': statements}
+    finally:
+        db.session.rollback()
+        remove_written_rows(user_id, last_workout_id, last_activity_id)
+    return {'revision': git_revision(),
+            'measured_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'repeat': repeat,
+            'dataset': {model.__tablename__: model.query.count() for model in [User, Exercise, Workout, Activity]},
+            'generated_with': generated,
+            'routes': results}
+
+def print_results(report):
+    print(f"revision {report['revision']}, dataset {report['dataset']}")
+    print(f"{'route':<44} {'status':>6} {'p50 ms':>9} {'p99 ms':>9} {'statements':>10}")
+    for name, result in report['routes'].items():
+        print(f"{name:<44} {result['status']:>6} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['statements']:>10.1f}")
+
+def print_comparison(before, after):
+    print(f"{before['revision']} -> {after['revision']}")
+    print(f"{'route':<44} {'p50 ms':>19} {'p99 ms':>19} {'statements':>13}")
+    for name, result in after['routes'].items():
+        old = before['routes'].get(name)
+        if not old:
+            print(f"{name:<44} {'(new)':>19}")
+            continue
+        print(f"{name:<44} {old['p50_ms']:>8.2f} -> {result['p50_ms']:>7.2f} {old['p99_ms']:>8.2f} -> {result['p99_ms']:>7.2f} "
+              f"{old['statements']:>5.1f} -> {result['statements']:>4.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the routes against the current database.")
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two result files instead of running")
+    parser.add_argument('--generate', action='store_true', help="fill the database with a synthetic dataset first")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            print_comparison(json.load(before), json.load(after))
+    else:
+        generated = None
+        if args.generate:
+            generate_from_args(args)
+            generated = {option: value for option, value in vars(args).items() if option not in ('repeat', 'output', 'compare', 'generate', 'reset')}
+        report = run(args.repeat, generated)
+        print_results(report)
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(report, output, indent=2)
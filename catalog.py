@@ -0,0 +1,150 @@
+import hashlib
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from fast_json import dumps
+from metrics import CACHE_REQUESTS
+from models import Exercise
+
+# Changes made by other processes (seed.py, other gunicorn workers) are picked up when the cache expires
+CATALOG_TTL_SECONDS = 300
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+CatalogPayload = namedtuple('CatalogPayload', ['body', 'etag', 'last_modified', 'built_at', 'index'])
+
+def name_words(name):
+    """Splits a name or search into lowercase words"""
+    return re.findall(r'\w+', name.lower())
+
+class ExerciseIndex:
+    """Sorted index of every word in the exercise names, so a search is a binary search per word typed.
+
+    An exercise matches when each word of the query is the start of a word in its name.
+    """
+
+    def __init__(self, exercises):
+        self.exercises = exercises
+        self.by_name = {exercise['name']: exercise for exercise in exercises}
+        self.by_id = {exercise['id']: exercise for exercise in exercises}
+        self.names = [exercise['name'].lower() for exercise in exercises]
+        entries = sorted({(word, position) for position, name in enumerate(self.names) for word in name_words(name)})
+        self.words = [word for word, position in entries]
+        self.positions = [position for word, position in entries]
+
+    def prefixed(self, prefix):
+        """Returns the positions of the exercises with a word starting with prefix"""
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + '\uffff', start)
+        return set(self.positions[start:end])
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Returns up to limit matching exercises: exact matches first, then names starting with the query, then shorter names"""
+        words = name_words(query)
+        if not words:
+            return []
+        matches = set.intersection(*(self.prefixed(word) for word in words))
+        query = query.strip().lower()
+        ranked = heapq.nsmallest(limit, matches, key=lambda position: (self.names[position] != query,
+                                                       not self.names[position].startswith(query),
+                                                       len(self.names[position]),
+                                                       self.names[position]))
+        return [self.exercises[position] for position in ranked]
+
+class ExerciseCatalog:
+    """In-process cache of the encoded GET /api/exercises response, and the name/id maps and search index over the same exercises.
+
+    Rebuilt on first use after it is invalidated (when a commit changes an Exercise) or after CATALOG_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL_SECONDS):
+        self.ttl = ttl
+        self._payload = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Returns the cached payload, building it if it is missing or expired"""
+        payload = self._payload
+        if payload is None or time.monotonic() - payload.built_at > self.ttl:
+            with self._lock:
+                payload = self._payload
+                if payload is None or time.monotonic() - payload.built_at > self.ttl:
+                    CACHE_REQUESTS.labels('exercise_catalog', 'miss').inc()
+                    return self._build(payload)
+        CACHE_REQUESTS.labels('exercise_catalog', 'hit').inc()
+        return payload
+
+    def find(self, name):
+        """Returns the serialized exercise with a name, or None if there is none"""
+        return self._resolve(self.get().index.by_name.get(name), Exercise.query.filter_by(name=name))
+
+    def find_by_id(self, exercise_id):
+        """Returns the serialized exercise with an id, or None if there is none"""
+        return self._resolve(self.get().index.by_id.get(exercise_id), Exercise.query.filter_by(id=exercise_id))
+
+    def _resolve(self, exercise, query):
+        # An exercise missing from the cache may have been added by another process (or earlier in this transaction),
+        # so misses, which are rare, are checked against the database and the cache is rebuilt if it was out of date
+        if exercise is None:
+            row = query.first()
+            if row is not None:
+                self.invalidate()
+                exercise = row.serialize()
+        return exercise
+
+    def invalidate(self):
+        """Discards the cached payload, so the next request rebuilds it from the database"""
+        with self._lock:
+            self._generation += 1
+            self._payload = None
+
+    def _build(self, previous):
+        generation = self._generation
+        exercises = Exercise.query.order_by(Exercise.id).all()
+        serialized = [exercise.serialize() for exercise in exercises]
+        body = dumps({'exercises': serialized})
+        etag = hashlib.sha256(body).hexdigest()
+        if previous and previous.etag == etag:
+            last_modified = previous.last_modified
+        else:
+            last_modified = datetime.utcnow().replace(microsecond=0)
+        payload = CatalogPayload(body, etag, last_modified, time.monotonic(), ExerciseIndex(serialized))
+        if generation == self._generation:
+            self._payload = payload
+        return payload
+
+exercise_catalog = ExerciseCatalog()
+
+@event.listens_for(Session, 'before_flush')
+def flag_exercise_changes(session, flush_context, instances):
+    """Remembers that the session is about to write Exercise rows"""
+    if any(isinstance(instance, Exercise) for instance in chain(session.new, session.dirty, session.deleted)):
+        session.info['exercise_catalog_changed'] = True
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def flag_bulk_exercise_changes(bulk_context):
+    """Remembers that a bulk UPDATE or DELETE touched Exercise rows"""
+    if bulk_context.mapper.class_ is Exercise:
+        bulk_context.session.info['exercise_catalog_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_exercise_catalog(session):
+    """Invalidates the catalog once Exercise changes are committed, so a rebuild never sees uncommitted rows"""
+    if session.info.pop('exercise_catalog_changed', False):
+        exercise_catalog.invalidate()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_exercise_changes(session, previous_transaction):
+    """Rolled back Exercise changes never reached the database"""
+    session.info.pop('exercise_catalog_changed', None)
@@ -0,0 +1,153 @@
+from datetime import datetime
+
+import click
+import requests
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from catalog import exercise_catalog
+from models import db, Exercise, Catalog_Sync_Page
+
+DEFAULT_PAGE_SIZE = 100
+# wger's id for English
+DEFAULT_LANGUAGE = 2
+# wger's exercise category for cardio; other categories are body parts
+CARDIO_CATEGORY = 15
+CARDIO_WORDS = ('run', 'cycling', 'bike', 'row', 'walk', 'jog', 'swim', 'jump', 'burpee', 'climb')
+ENDURANCE_WORDS = ('plank', 'hold', 'hang', 'stretch', 'sit')
+
+def exercise_type(name, category=None):
+    """Guesses an exercise's type from its wger category and name"""
+    lowered = name.lower()
+    if category == CARDIO_CATEGORY or any(word in lowered for word in CARDIO_WORDS):
+        return 'Cardio'
+    if any(word in lowered for word in ENDURANCE_WORDS):
+        return 'Endurance'
+    return 'Strength'
+
+def fetch_changed_pages(base_url, page_size=DEFAULT_PAGE_SIZE, language=DEFAULT_LANGUAGE, full=False):
+    """Pages through the upstream exercise list, skipping pages that are unchanged since the last sync.
+
+    Each page is requested with the ETag and Last-Modified it was last synced with; a 304 answer is followed to the
+    next page saved with it.  Returns the exercises from the changed pages, the validators to save for them and the
+    number of unchanged pages.  Raises requests.RequestException if the upstream API fails.
+    """
+    saved = {} if full else {page.url: page for page in Catalog_Sync_Page.query}
+    url = requests.Request('GET', f"{base_url}/exercise/", params={'limit': page_size, 'offset': 0, 'language': language}).prepare().url
+    exercises, pages, unchanged, seen = [], [], 0, set()
+    with requests.Session() as http:
+        while url and url not in seen:
+            seen.add(url)
+            page = saved.get(url)
+            headers = {}
+            if page and page.etag:
+                headers['If-None-Match'] = page.etag
+            if page and page.last_modified:
+                headers['If-Modified-Since'] = page.last_modified
+            resp = http.get(url, headers=headers, timeout=10)
+            if resp.status_code == 304 and page:
+                unchanged += 1
+                url = page.next_url
+                continue
+            resp.raise_for_status()
+            body = resp.json()
+            exercises.extend(body['results'])
+            pages.append({'url': url,
+                        'etag': resp.headers.get('ETag'),
+                        'last_modified': resp.headers.get('Last-Modified'),
+                        'next_url': body.get('next'),
+                        'synced_at': datetime.utcnow()})
+            url = body.get('next')
+    return exercises, pages, unchanged
+
+def diff_exercises(upstream, current):
+    """Compares upstream exercises with the current {id: name} catalog.
+
+    Returns the rows to insert or rename, and the aliases: upstream exercises whose name another exercise has after
+    every rename (wger lists some exercises more than once), as {upstream id: id of the exercise with the name}.
+    Names are unique, so an alias is not added, or keeps its current name; activities use the exercise with the name.
+    An exercise keeping its name wins it, and otherwise the lowest id does.  Renames are checked against the names
+    after all of them, so chains and swaps are renames, not aliases; sync_exercises applies them without clashing.
+    """
+    wanted = {}
+    for result in sorted(upstream, key=lambda result: result['id']):
+        name = (result.get('name') or '').strip()
+        if name:
+            wanted.setdefault(result['id'], name)
+    categories = {result['id']: result.get('category') for result in upstream}
+    blocked = set()
+    while True:
+        final = dict(current)
+        final.update((exercise_id, name) for exercise_id, name in wanted.items() if exercise_id not in blocked)
+        claims = {}
+        for exercise_id, name in final.items():
+            claims.setdefault(name, []).append(exercise_id)
+        clashes = [ids for ids in claims.values() if len(ids) > 1]
+        if not clashes:
+            # A name can be given up by the exercise that beat a blocked one to it
+            freed = [exercise_id for exercise_id in sorted(blocked) if wanted[exercise_id] not in claims]
+            if not freed:
+                break
+            blocked.discard(freed[0])
+            continue
+        for ids in clashes:
+            keeper = next((exercise_id for exercise_id in ids if final[exercise_id] == current.get(exercise_id)), min(ids))
+            blocked.update(exercise_id for exercise_id in ids if exercise_id != keeper)
+
+    holders = {name: exercise_id for exercise_id, name in final.items()}
+    rows = [{'id': exercise_id, 'name': name, 'type': exercise_type(name, categories.get(exercise_id))}
+            for exercise_id, name in sorted(final.items()) if current.get(exercise_id) != name]
+    aliases = {exercise_id: holders[wanted[exercise_id]] for exercise_id in sorted(blocked)}
+    return rows, aliases
+
+def sync_exercises(base_url, page_size=DEFAULT_PAGE_SIZE, language=DEFAULT_LANGUAGE, full=False):
+    """Brings the exercises table up to date with the upstream exercise list and returns what changed.
+
+    Only pages that changed upstream are downloaded.  New exercises are inserted and renamed ones updated with one
+    upsert, after giving exercises whose name moves to another a temporary one, in the same transaction as the saved
+    page validators.  Exercises are never deleted, since activities refer to them, and existing types are kept.
+    """
+    upstream, pages, unchanged = fetch_changed_pages(base_url, page_size, language, full)
+    current = dict(db.session.query(Exercise.id, Exercise.name))
+    rows, aliases = diff_exercises(upstream, current)
+
+    if rows:
+        # Move exercises giving up a name another row takes out of its way first, so chains and swaps don't clash
+        taken = {row['name'] for row in rows}
+        freeing = [row['id'] for row in rows if current.get(row['id']) in taken]
+        if freeing:
+            db.session.execute(Exercise.__table__.update()
+                            .where(Exercise.id.in_(freeing))
+                            .values(name=db.func.concat('renaming exercise ', Exercise.id)))
+        statement = insert(Exercise.__table__).values(rows)
+        db.session.execute(statement.on_conflict_do_update(index_elements=[Exercise.id], set_={'name': statement.excluded.name}))
+        # Ids come from upstream, so move the sequence past them for exercises added locally
+        db.session.execute(db.text("SELECT setval(pg_get_serial_sequence('exercises', 'id'), coalesce(max(id), 0) + 1, false) FROM exercises"))
+    if pages:
+        statement = insert(Catalog_Sync_Page.__table__).values(pages)
+        db.session.execute(statement.on_conflict_do_update(index_elements=[Catalog_Sync_Page.url],
+                        set_={column: statement.excluded[column] for column in ('etag', 'last_modified', 'next_url', 'synced_at')}))
+    db.session.commit()
+    if rows:
+        exercise_catalog.invalidate()
+    return {'pages fetched': len(pages),
+            'pages unchanged': unchanged,
+            'added': sum(1 for row in rows if row['id'] not in current),
+            'renamed': sum(1 for row in rows if row['id'] in current),
+            'aliases': aliases}
+
+def init_app(app):
+    """Adds the `flask sync-exercises` command"""
+
+    @app.cli.command('sync-exercises')
+    @click.option('--url', help="API root to sync from; defaults to WGER_API_URL.")
+    @click.option('--page-size', type=int, default=DEFAULT_PAGE_SIZE, show_default=True)
+    @click.option('--language', type=int, default=DEFAULT_LANGUAGE, show_default=True, help="wger language id.")
+    @click.option('--full', is_flag=True, help="Download every page, even if unchanged since the last sync.")
+    def sync_command(url, page_size, language, full):
+        """Add new and renamed exercises from the wger exercise list."""
+        result = sync_exercises(url or current_app.config['WGER_API_URL'], page_size, language, full)
+        aliases = result.pop('aliases')
+        click.echo(', '.join(f"{count} {label}" for label, count in result.items()))
+        for alias_id, exercise_id in sorted(aliases.items()):
+            click.echo(f"Upstream exercise {alias_id} has the same name as exercise {exercise_id}; not added")
@@ -0,0 +1,179 @@
+"""Generates realistic synthetic users, workouts and activities and loads them with PostgreSQL COPY.
+
+    python datagen.py --users 10000 --workouts-per-user 60 --activities-per-workout 5 --years 3 --seed 1
+
+The database must already have the schema (flask db upgrade).  --reset empties it first; otherwise it must be empty,
+so generated data is never mixed into real data.  Every user's password is "password".
+"""
+import argparse
+import csv
+import io
+import math
+import random
+from itertools import accumulate
+from datetime import datetime, timedelta
+
+from app import app
+from catalog_sync import exercise_type
+from exerciseList import idLookup
+from exercise_stats import rebuild_exercise_stats
+from models import db, User
+from passwords import password_hasher
+
+# Rows buffered per table before they are sent with COPY
+CHUNK_SIZE = 50000
+TABLES = ['users', 'exercises', 'activities', 'workouts', 'workout_activities', 'exercise_info', 'user_exercise_stats']
+USER_COLUMNS = ['id', 'username', 'email', 'password']
+EXERCISE_COLUMNS = ['id', 'name', 'type']
+WORKOUT_COLUMNS = ['id', 'creator', 'name', 'datetime', 'is_private', 'is_logged']
+ACTIVITY_COLUMNS = ['id', 'performed_by', 'exercise_id', 'weight', 'weight_units', 'reps', 'sets',
+                    'duration', 'duration_units', 'distance', 'distance_units', 'datetime']
+LINK_COLUMNS = ['workout_id', 'activity_id']
+SYNTHETIC_TYPES = ['Strength', 'Strength', 'Cardio', 'Endurance']
+WORKOUT_NAMES = ['Push Day', 'Pull Day', 'Leg Day', 'Upper Body', 'Lower Body', 'Full Body', 'Cardio', 'Core', 'Morning Workout']
+
+def exercise_catalog(count):
+    """Returns exercise rows: the wger exercises from exerciseList (keeping their wger ids), then synthetic ones past
+    the end of the list, so exercise info lookups by id only ever ask wger about the exercise with that name"""
+    rows = [(exercise_id, name, exercise_type(name)) for name, exercise_id in list(idLookup.items())[:count]]
+    next_id = max(idLookup.values()) + 1
+    rows += [(next_id + n, f"Synthetic Exercise {n}", SYNTHETIC_TYPES[n % len(SYNTHETIC_TYPES)]) for n in range(count - len(rows))]
+    return rows
+
+def lognormal(rng, mean, sigma):
+    """Draws from a log-normal distribution with the given mean, so a few values are much larger than the rest"""
+    return rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+
+class CopyLoader:
+    """Buffers rows per table and sends them with COPY ... FROM STDIN, parents before children"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.buffers = {}
+
+    def add(self, table, columns, row):
+        buffer = self.buffers.setdefault(table, (columns, []))[1]
+        buffer.append(row)
+
+    def pending(self):
+        return max((len(rows) for columns, rows in self.buffers.values()), default=0)
+
+    def flush(self):
+        for table, (columns, rows) in self.buffers.items():
+            if rows:
+                data = io.StringIO()
+                csv.writer(data).writerows(rows)
+                data.seek(0)
+                self.cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", data)
+                rows.clear()
+
+def activity_values(rng, kind, strength, progress):
+    """Returns the stat columns for one activity; strength scales weights and progress (0 to 1) is how far into the user's history it is"""
+    if kind == 'Cardio':
+        minutes = max(5, round(rng.gauss(30 + 10 * progress, 10)))
+        units = rng.choice(['miles', 'km'])
+        pace = rng.uniform(6, 12) if units == 'miles' else rng.uniform(4, 8)
+        return (None, None, None, None, minutes, 'mins', f"{minutes / pace:.1f}", units)
+    if kind == 'Endurance':
+        return (None, None, None, rng.randint(1, 4), max(10, round(rng.gauss(45 + 60 * progress, 15))), 'secs', None, None)
+    weight = max(5, round(strength * (1 + 0.4 * progress) * rng.uniform(0.9, 1.05) / 5) * 5)
+    return (weight, 'lbs', rng.choice([3, 5, 5, 8, 8, 10, 10, 12, 15]), rng.randint(2, 5), None, None, None, None)
+
+def generate(users, exercises, workouts_per_user, activities_per_workout, shared_fraction=0.3, logged_fraction=0.8, years=3, seed=0, now=None):
+    """Fills the database with a synthetic dataset and returns the number of rows written per table.
+
+    Exercise popularity follows a Zipf-like curve and each user mostly repeats a personal routine of favourites.
+    Users joined at different times up to `years` ago, train at very different rates (workouts per user is
+    log-normal around the requested mean) and get stronger over their history.  Workout sizes vary around the
+    requested mean.  The same seed (and now, which histories end at) always produces the same data.
+    """
+    rng = random.Random(seed)
+    now = now or datetime.utcnow().replace(microsecond=0)
+    hashed_password = password_hasher.hash("password")
+    catalog = exercise_catalog(exercises)
+    popularity = list(accumulate(1 / (rank + 1) for rank in range(len(catalog))))
+    counts = {'users': users, 'exercises': len(catalog), 'workouts': 0, 'activities': 0}
+
+    connection = db.engine.raw_connection()
+    try:
+        loader = CopyLoader(connection.cursor())
+        for row in catalog:
+            loader.add('exercises', EXERCISE_COLUMNS, row)
+
+        for user_id in range(1, users + 1):
+            loader.add('users', USER_COLUMNS, (user_id, f"user{user_id}", f"user{user_id}@example.com", hashed_password))
+            routine = list({exercise[0]: exercise for exercise in rng.choices(catalog, cum_weights=popularity, k=rng.randint(4, 10))}.values())
+            strength = {exercise[0]: rng.uniform(20, 200) for exercise in routine}
+            history_days = rng.uniform(14, 365 * years)
+            workout_count = max(1, round(lognormal(rng, workouts_per_user, 0.8)))
+            for offset_days in sorted(rng.uniform(0, history_days) for _ in range(workout_count)):
+                counts['workouts'] += 1
+                workout_id = counts['workouts']
+                started = now - timedelta(days=history_days - offset_days, hours=rng.uniform(0, 12))
+                progress = offset_days / history_days
+                loader.add('workouts', WORKOUT_COLUMNS, (workout_id, user_id, rng.choice(WORKOUT_NAMES), started,
+                            rng.random() < 1 - shared_fraction, rng.random() < logged_fraction))
+                size = 1 + min(19, int(rng.expovariate(1 / (activities_per_workout - 1)))) if activities_per_workout > 1 else 1
+                for position in range(size):
+                    if rng.random() < 0.85:
+                        exercise_id, name, kind = rng.choice(routine)
+                    else:
+                        exercise_id, name, kind = rng.choices(catalog, cum_weights=popularity)[0]
+                    counts['activities'] += 1
+                    activity_id = counts['activities']
+                    values = activity_values(rng, kind, strength.get(exercise_id, 50), progress)
+                    loader.add('activities', ACTIVITY_COLUMNS, (activity_id, user_id, exercise_id) + values
+                                + (started + timedelta(minutes=6 * position),))
+                    loader.add('workout_activities', LINK_COLUMNS, (workout_id, activity_id))
+            if loader.pending() >= CHUNK_SIZE:
+                loader.flush()
+        loader.flush()
+
+        cursor = connection.cursor()
+        for table in ['users', 'exercises', 'workouts', 'activities']:
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), coalesce(max(id), 0) + 1, false) FROM {table}")
+        connection.commit()
+        cursor.execute(f"ANALYZE {', '.join(TABLES)}")
+        connection.commit()
+    finally:
+        connection.close()
+    counts['exercise summaries'] = rebuild_exercise_stats()
+    return counts
+
+def reset_tables():
+    """Empties every table the generator fills"""
+    db.session.execute(db.text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE"))
+    db.session.commit()
+
+def add_arguments(parser, reset_option=True, **defaults):
+    """Adds the dataset options; also used by seed.py, which always starts from empty tables and so has no --reset,
+    and the benchmarks, which pass their own defaults"""
+    options = dict({'users': 1000, 'exercises': len(idLookup), 'workouts_per_user': 60, 'activities_per_workout': 5}, **defaults)
+    parser.add_argument('--users', type=int, default=options['users'])
+    parser.add_argument('--exercises', type=int, default=options['exercises'],
+                        help=f"fewer than the {len(idLookup)} wger exercises uses the first ones; more adds synthetic ones")
+    parser.add_argument('--workouts-per-user', type=int, default=options['workouts_per_user'], help="average; varies widely between users")
+    parser.add_argument('--activities-per-workout', type=int, default=options['activities_per_workout'], help="average")
+    parser.add_argument('--shared-fraction', type=float, default=0.3)
+    parser.add_argument('--logged-fraction', type=float, default=0.8)
+    parser.add_argument('--years', type=float, default=3, help="longest history")
+    parser.add_argument('--seed', type=int, default=0)
+    if reset_option:
+        parser.add_argument('--reset', action='store_true', help="empty the database first")
+
+def generate_from_args(args):
+    """Checks the database can be filled, then generates the dataset described by parsed arguments"""
+    if args.reset:
+        reset_tables()
+    elif db.session.query(User.query.exists()).scalar():
+        raise SystemExit("The database already has users; pass --reset to empty it first")
+    db.session.close()
+    return generate(args.users, args.exercises, args.workouts_per_user, args.activities_per_workout,
+                    shared_fraction=args.shared_fraction, logged_fraction=args.logged_fraction,
+                    years=args.years, seed=args.seed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fill the database with a synthetic dataset.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(generate_from_args(args))
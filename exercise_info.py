@@ -0,0 +1,85 @@
+import threading
+from datetime import datetime, timedelta
+
+import requests
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from metrics import CACHE_REQUESTS
+from models import db, Exercise_Info
+
+def fetch_exercise_info(base_url, exercise_id):
+    """Fetches an exercise's details from the wger API (or whatever server base_url points at)"""
+    resp = requests.get(f"{base_url}/exerciseinfo/{exercise_id}/", timeout=5)
+    resp.raise_for_status()
+    return resp.json()
+
+def store_exercise_info(exercise_id, details):
+    """Inserts or replaces the cached details for an exercise"""
+    statement = insert(Exercise_Info).values(exercise_id=exercise_id, details=details, fetched_at=datetime.utcnow())
+    db.session.execute(statement.on_conflict_do_update(
+                    index_elements=[Exercise_Info.exercise_id],
+                    set_={'details': statement.excluded.details, 'fetched_at': statement.excluded.fetched_at}))
+    db.session.commit()
+
+class ExerciseInfoCache:
+    """Read-through cache of wger exercise details, persisted in the exercise_info table.
+
+    Details younger than EXERCISE_INFO_TTL are served as is.  Older details are still served, up to
+    EXERCISE_INFO_STALE_TTL, while a background thread refreshes them; past that they are refetched before responding.
+    """
+
+    def __init__(self):
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, exercise_id):
+        """Returns the details for an exercise, fetching them if there is no usable cached copy.
+
+        Raises requests.RequestException if they must be fetched and the upstream API fails.
+        """
+        config = current_app.config
+        cached = Exercise_Info.query.get(exercise_id)
+        if cached:
+            age = datetime.utcnow() - cached.fetched_at
+            if age < timedelta(seconds=config['EXERCISE_INFO_TTL']):
+                CACHE_REQUESTS.labels('exercise_info', 'hit').inc()
+                return cached.details
+            if age < timedelta(seconds=config['EXERCISE_INFO_STALE_TTL']):
+                CACHE_REQUESTS.labels('exercise_info', 'stale').inc()
+                self.refresh_in_background(exercise_id)
+                return cached.details
+        CACHE_REQUESTS.labels('exercise_info', 'miss').inc()
+        try:
+            details = fetch_exercise_info(config['WGER_API_URL'], exercise_id)
+        except requests.RequestException:
+            if cached:
+                return cached.details
+            raise
+        store_exercise_info(exercise_id, details)
+        return details
+
+    def refresh_in_background(self, exercise_id):
+        """Starts refetching an exercise's details on another thread, unless a refresh is already running"""
+        with self._lock:
+            if exercise_id in self._refreshing:
+                return None
+            self._refreshing.add(exercise_id)
+        refresher = threading.Thread(target=self._refresh,
+                    args=(current_app._get_current_object(), exercise_id),
+                    daemon=True)
+        refresher.start()
+        return refresher
+
+    def _refresh(self, app, exercise_id):
+        try:
+            with app.app_context():
+                details = fetch_exercise_info(app.config['WGER_API_URL'], exercise_id)
+                store_exercise_info(exercise_id, details)
+        except requests.RequestException:
+            app.logger.warning(f"Could not refresh exercise info for exercise {exercise_id}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(exercise_id)
+
+exercise_info_cache = ExerciseInfoCache()
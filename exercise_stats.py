@@ -0,0 +1,86 @@
+import click
+from sqlalchemy import cast, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from history import STAT_COLUMNS
+from models import db, Activity, Workout, Workout_Activity, User_Exercise_Stats
+
+stats_table = User_Exercise_Stats.__table__
+STATS_COLUMNS = ['user_id', 'exercise_id', 'first_performed', 'last_performed', 'session_count', 'activity_count',
+                    'best_weight', 'best_reps', 'total_volume', 'total_distance', 'total_duration', 'version']
+
+def summary_select(pairs=None):
+    """Returns a SELECT of the summary rows computed from logged workouts, for every (user, exercise) or only the given pairs.
+
+    Volume is summed as a float, since a lifetime of sets x reps x weight can overflow a bigint.
+    """
+    statement = (db.select([Workout.creator,
+                            Activity.exercise_id,
+                            func.min(Activity.datetime),
+                            func.max(Activity.datetime),
+                            func.count(Workout.id.distinct()),
+                            func.count(Activity.id.distinct()),
+                            func.max(Activity.weight),
+                            func.max(Activity.reps),
+                            func.sum(cast(Activity.sets, db.Float) * Activity.reps * Activity.weight),
+                            func.sum(STAT_COLUMNS['distance']),
+                            func.sum(STAT_COLUMNS['duration']),
+                            func.txid_current()])
+                    .select_from(Activity)
+                    .join(Workout_Activity, Workout_Activity.activity_id == Activity.id)
+                    .join(Workout, Workout.id == Workout_Activity.workout_id)
+                    .where(Workout.is_logged == True)
+                    .group_by(Workout.creator, Activity.exercise_id))
+    if pairs is not None:
+        statement = statement.where(tuple_(Workout.creator, Activity.exercise_id).in_(pairs))
+    return statement
+
+def workout_pairs(workout_ids):
+    """Returns the (user, exercise) pairs whose summaries depend on the given workouts"""
+    return set(db.session.query(Workout.creator, Activity.exercise_id)
+                    .join(Workout_Activity, Workout_Activity.workout_id == Workout.id)
+                    .join(Activity, Activity.id == Workout_Activity.activity_id)
+                    .filter(Workout.id.in_(workout_ids))
+                    .distinct())
+
+def activity_pairs(activity_ids):
+    """Returns the (user, exercise) pairs whose summaries depend on the given activities"""
+    return set(db.session.query(Workout.creator, Activity.exercise_id)
+                    .join(Workout_Activity, Workout_Activity.workout_id == Workout.id)
+                    .join(Activity, Activity.id == Workout_Activity.activity_id)
+                    .filter(Activity.id.in_(activity_ids))
+                    .distinct())
+
+def refresh_exercise_stats(pairs):
+    """Recomputes the summaries for the given (user, exercise) pairs within the current transaction.
+
+    Each summary is rebuilt from the user's logged activities for the exercise rather than adjusted, so deletes and
+    edits that lower a best weight are handled the same way as inserts.  Summaries are upserted, so transactions
+    refreshing the same pair at once wait for each other instead of clashing on the key.  Pairs left without logged
+    activities are then removed: every summary written here has this transaction's id as its version.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return
+    db.session.flush()
+    statement = insert(stats_table).from_select(STATS_COLUMNS, summary_select(pairs))
+    db.session.execute(statement.on_conflict_do_update(index_elements=[stats_table.c.user_id, stats_table.c.exercise_id],
+                    set_={column: statement.excluded[column] for column in STATS_COLUMNS[2:]}))
+    db.session.execute(stats_table.delete()
+                    .where(tuple_(stats_table.c.user_id, stats_table.c.exercise_id).in_(pairs))
+                    .where(stats_table.c.version != func.txid_current()))
+
+def rebuild_exercise_stats():
+    """Recomputes every summary from scratch and returns how many there are"""
+    db.session.execute(stats_table.delete())
+    db.session.execute(stats_table.insert().from_select(STATS_COLUMNS, summary_select()))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(stats_table).scalar()
+
+def init_app(app):
+    """Adds the `flask rebuild-exercise-stats` command"""
+
+    @app.cli.command('rebuild-exercise-stats')
+    def rebuild_command():
+        """Recompute every user's exercise summaries from their logged workouts."""
+        click.echo(f"Rebuilt {rebuild_exercise_stats()} exercise summaries")
@@ -0,0 +1,109 @@
+"""Prints the EXPLAIN plan of every SQL statement issued by the app's read-only routes.
+
+    python explain_routes.py             # plans against the current schema
+    python explain_routes.py --compare   # plans without, then with, the route indexes
+    python explain_routes.py --analyze   # EXPLAIN ANALYZE, to see actual row counts and timings
+
+--compare drops the indexes inside a transaction that is rolled back afterwards, which still locks the
+tables while it runs, so point DATABASE_URL at a development copy of the data rather than production.
+"""
+import argparse
+from collections import Counter
+
+from sqlalchemy import event
+
+from app import app, USER_KEY
+from models import db, Activity, Exercise, Workout
+
+# Indexes and constraints added by migrations 0002_index_hot_query_paths.py and 0008_index_activities_by_performer_and_exercise.py
+ROUTE_INDEXES = [
+    'ix_activities_performed_by_exercise_id_datetime',
+    'ix_workout_activities_activity_id',
+    'ix_workouts_creator_datetime',
+    'ix_workouts_shared_datetime',
+]
+ROUTE_CONSTRAINTS = [
+    ('workout_activities', 'uq_workout_activities_workout_id_activity_id'),
+]
+
+def sample_routes():
+    """Returns a user id and the read-only routes to exercise as that user, using the user with the most workouts"""
+    user_id, workout_id = (db.session.query(Workout.creator, db.func.max(Workout.id))
+                    .group_by(Workout.creator)
+                    .order_by(db.func.count(Workout.id).desc())
+                    .first())
+    activity = Activity.query.filter_by(performed_by=user_id).order_by(Activity.id.desc()).first()
+    exercise = Exercise.query.get(activity.exercise_id) if activity else Exercise.query.first()
+    return user_id, [
+        '/workouts',
+        f'/users/{user_id}/workouts',
+        f'/users/{user_id}/logs',
+        f'/workouts/{workout_id}',
+        f'/workouts/{workout_id}/edit',
+        f'/api/workouts/{workout_id}/activities',
+        '/api/exercises',
+        f'/api/exercises/{exercise.name}',
+        f'/api/users/logs/{exercise.name}',
+        f'/api/users/logs/{exercise.name}/weight?bucket=week',
+    ]
+
+def capture_statements(user_id, urls):
+    """Requests each url as the given user and returns the SELECT statements issued, per url"""
+    captured = []
+    current_url = None
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((current_url, statement, parameters))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess[USER_KEY] = user_id
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for current_url in urls:
+            client.get(current_url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return captured
+
+def print_plans(statements, analyze=False, without_indexes=False):
+    """Prints the plan for each distinct statement, optionally with the route indexes dropped for the duration"""
+    counts = Counter((url, statement) for url, statement, parameters in statements)
+    explain = 'EXPLAIN ANALYZE ' if analyze else 'EXPLAIN '
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if without_indexes:
+            for index_name in ROUTE_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+            for table_name, constraint_name in ROUTE_CONSTRAINTS:
+                cursor.execute(f'ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint_name}')
+        printed = set()
+        for url, statement, parameters in statements:
+            if (url, statement) in printed:
+                continue
+            printed.add((url, statement))
+            cursor.execute(explain + statement, parameters)
+            print(f"=== {url} (issued {counts[(url, statement)]}x)")
+            print(' '.join(statement.split()))
+            for (line,) in cursor.fetchall():
+                print(f"    {line}")
+            print()
+    finally:
+        connection.rollback()
+        connection.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print EXPLAIN plans for the queries behind each read-only route.")
+    parser.add_argument('--compare', action='store_true', help="also print plans without the route indexes, first")
+    parser.add_argument('--analyze', action='store_true', help="use EXPLAIN ANALYZE")
+    args = parser.parse_args()
+
+    user_id, urls = sample_routes()
+    statements = capture_statements(user_id, urls)
+    if args.compare:
+        print("##### Before: without route indexes\n")
+        print_plans(statements, analyze=args.analyze, without_indexes=True)
+        print("##### After: with route indexes\n")
+    print_plans(statements, analyze=args.analyze)
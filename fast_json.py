@@ -0,0 +1,46 @@
+import json
+from decimal import Decimal
+
+import orjson
+from flask import current_app
+from sqlalchemy.engine import Row
+
+# Datetimes are encoded as ISO 8601; naive ones in the database are UTC
+OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+def records(rows):
+    """Returns result rows as dicts keyed by column label"""
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+def default(obj):
+    """Encodes the types orjson does not handle itself"""
+    if isinstance(obj, Row):
+        return dict(zip(obj._fields, obj))
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj):
+    """Encodes obj as JSON bytes"""
+    return orjson.dumps(obj, default=default, option=OPTIONS)
+
+class OrjsonEncoder(json.JSONEncoder):
+    """Encoder for Flask's own JSON handling (dicts returned by views, flask.json), producing the same output as dumps"""
+
+    def encode(self, o):
+        return dumps(o).decode('utf-8')
+
+def init_app(app):
+    """Makes Flask encode everything else it turns into JSON with orjson too"""
+    app.json_encoder = OrjsonEncoder
+
+# Flask 1.1 has no pluggable JSON provider, and its JSON goes through a str, so routes import this instead of flask.jsonify
+def jsonify(*args, **kwargs):
+    """Like flask.jsonify: builds a JSON response from one argument, several (as a list) or keyword arguments"""
+    if args and kwargs:
+        raise TypeError("jsonify() behavior undefined when passed both args and kwargs")
+    data = args[0] if len(args) == 1 else args or kwargs
+    return current_app.response_class(dumps(data) + b"\n", mimetype=current_app.config['JSONIFY_MIMETYPE'])
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import namedtuple
+from itertools import chain
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from metrics import CACHE_REQUESTS
+from models import Workout, Workout_Activity
+from pagination import keyset_page
+
+# Changes made by other processes, and edits that bypass the session (batch updates), are picked up when the page expires
+FEED_TTL_SECONDS = 30
+
+# Plain copies of the cached rows, so they outlive the session that loaded them
+FeedWorkout = namedtuple('FeedWorkout', ['id', 'name', 'creator', 'datetime', 'is_private', 'is_logged'])
+FeedPage = namedtuple('FeedPage', ['workouts', 'cards', 'next_cursor', 'limit', 'built_at'])
+
+def shared_workouts_page(limit, after=None):
+    """Returns a page of shared workouts, newest first, their cards and the cursor for the next page.
+
+    Raises ValueError for a malformed cursor.
+    """
+    workouts, next_cursor = keyset_page(Workout.query.filter_by(is_private=False), Workout.datetime, Workout.id,
+                            after=after,
+                            limit=limit,
+                            descending=True)
+    return workouts, Workout.load_cards(workouts), next_cursor
+
+class PublicFeed:
+    """In-process cache of the first page of shared workouts shown at /workouts.
+
+    Rebuilt on first use after it is invalidated (when a commit shares, unshares or deletes a workout, or changes a
+    shared workout or the activities of one on the page) or after FEED_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl=FEED_TTL_SECONDS):
+        self.ttl = ttl
+        self._page = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def first_page(self, limit):
+        """Returns the cached first page, building it if it is missing, expired or was built with another page size"""
+        page = self._page
+        if not self._fresh(page, limit):
+            with self._lock:
+                page = self._page
+                if not self._fresh(page, limit):
+                    CACHE_REQUESTS.labels('public_feed', 'miss').inc()
+                    return self._build(limit)
+        CACHE_REQUESTS.labels('public_feed', 'hit').inc()
+        return page
+
+    def workout_ids(self):
+        """Returns the ids of the workouts on the cached page"""
+        page = self._page
+        return {workout.id for workout in page.workouts} if page else set()
+
+    def invalidate(self):
+        """Discards the cached page, so the next request rebuilds it from the database"""
+        with self._lock:
+            self._generation += 1
+            self._page = None
+
+    def _fresh(self, page, limit):
+        return page is not None and page.limit == limit and time.monotonic() - page.built_at <= self.ttl
+
+    def _build(self, limit):
+        generation = self._generation
+        workouts, cards, next_cursor = shared_workouts_page(limit)
+        page = FeedPage([FeedWorkout(*(getattr(workout, field) for field in FeedWorkout._fields)) for workout in workouts],
+                    cards, next_cursor, limit, time.monotonic())
+        if generation == self._generation:
+            self._page = page
+        return page
+
+public_feed = PublicFeed()
+
+def changes_feed(instance):
+    """Returns whether writing an instance could change what the public feed shows"""
+    if isinstance(instance, Workout):
+        # New workouts are private until flushed unless made shared; an unshared workout was shared before this change
+        return False in (instance.is_private, *(inspect(instance).attrs.is_private.history.deleted or ()))
+    if isinstance(instance, Workout_Activity):
+        return instance.workout_id in public_feed.workout_ids()
+    return False
+
+@event.listens_for(Session, 'before_flush')
+def flag_feed_changes(session, flush_context, instances):
+    """Remembers that the session is about to write rows shown in the public feed"""
+    if any(changes_feed(instance) for instance in chain(session.new, session.dirty, session.deleted)):
+        session.info['public_feed_changed'] = True
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def flag_bulk_feed_changes(bulk_context):
+    """Remembers that a bulk UPDATE or DELETE touched Workout rows"""
+    if bulk_context.mapper.class_ is Workout:
+        bulk_context.session.info['public_feed_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_public_feed(session):
+    """Invalidates the feed once the changes are committed, so a rebuild never sees uncommitted rows"""
+    if session.info.pop('public_feed_changed', False):
+        public_feed.invalidate()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_feed_changes(session, previous_transaction):
+    """Rolled back changes never reached the database"""
+    session.info.pop('public_feed_changed', None)
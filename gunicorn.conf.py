@@ -0,0 +1,53 @@
+"""Gunicorn settings, loaded automatically by `gunicorn app:app` from the working directory.
+
+The worker class, worker count and preloading come from runtime_config; see there for the environment variables.
+"""
+import os
+import shutil
+import tempfile
+
+import runtime_config
+
+runtime_config.serve_web()
+_settings = runtime_config.worker_settings()
+worker_class = _settings['worker_class']
+workers = _settings['workers']
+threads = _settings['threads']
+worker_connections = _settings['worker_connections']
+preload_app = _settings['preload_app']
+
+if worker_class == 'gevent':
+    # Patch before the app (and with it ssl, threading and psycopg2) is imported by preload_app
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+# Each worker writes its metrics to files here so /metrics can merge them; see metrics.py.
+# prometheus_client picks its storage when first imported, and the master creates files of its own when it preloads
+# the app, so the directory is cleared of a previous run's files and created here, before anything imports it.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'workoutpartner-metrics'))
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+from prometheus_client import multiprocess
+
+def on_starting(server):
+    """Logs where worker metrics are collected"""
+    server.log.info("Collecting worker metrics in %s", os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+def pre_fork(server, worker):
+    """Closes any connections the master opened while preloading the app, so no worker inherits a shared socket"""
+    if preload_app:
+        from models import db
+        db.engine.dispose()
+
+def post_fork(server, worker):
+    """Gives each worker a fresh connection pool of its own"""
+    if preload_app:
+        from models import db
+        db.engine.dispose()
+
+def child_exit(server, worker):
+    """Drops a dead worker's live gauges (its counters and histograms are kept)"""
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, cast, func
+
+from fast_json import records
+from models import db, Activity, Workout, Workout_Activity
+from pagination import keyset_page, DEFAULT_PAGE_SIZE
+
+# Distance is stored as text, so only values that look like numbers are aggregated
+STAT_COLUMNS = {
+    'weight': Activity.weight,
+    'reps': Activity.reps,
+    'sets': Activity.sets,
+    'duration': Activity.duration,
+    'distance': case((Activity.distance.op('~')(r'^\d+(\.\d+)?$'), cast(Activity.distance, db.Float)), else_=None),
+    'volume': cast(Activity.sets, db.BigInteger) * Activity.reps * Activity.weight,
+}
+BUCKETS = ('day', 'week', 'month')
+
+def parse_date(value):
+    """Parses a YYYY-MM-DD query parameter into a datetime, or returns None if not given"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def logged_activities(user_id, exercise_id, since=None, until=None):
+    """Returns a query of the activities for an exercise within a user's logged workouts.
+
+    since and until are inclusive dates.  An activity appears once, even if it is in more than one logged workout.
+    Filtering on the performer as well lets pages read a range of ix_activities_performed_by_exercise_id_datetime;
+    activities are only ever linked to their performer's workouts.
+    """
+    in_logged_workout = (db.session.query(Workout_Activity.id)
+                    .join(Workout, Workout.id == Workout_Activity.workout_id)
+                    .filter(Workout_Activity.activity_id == Activity.id,
+                            Workout.creator == user_id,
+                            Workout.is_logged == True)
+                    .exists())
+    query = Activity.query.filter(Activity.performed_by == user_id, Activity.exercise_id == exercise_id, in_logged_workout)
+    if since:
+        query = query.filter(Activity.datetime >= since)
+    if until:
+        query = query.filter(Activity.datetime < until + timedelta(days=1))
+    return query
+
+def exercise_history(user_id, exercise_id, since=None, until=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """Returns one page of a user's logged stats for an exercise, oldest first, and the cursor for the next page.
+
+    Each page costs the same no matter how long the user's history is.
+    """
+    query = (logged_activities(user_id, exercise_id, since, until)
+                    .with_entities(Activity.id,
+                            Activity.datetime,
+                            Activity.weight,
+                            Activity.sets,
+                            Activity.reps,
+                            Activity.duration,
+                            Activity.distance))
+    rows, next_cursor = keyset_page(query, Activity.datetime, Activity.id, after=after, limit=limit)
+    return records(rows), next_cursor
+
+def stat_aggregates(user_id, exercise_id, stat_name, bucket='day', since=None, until=None):
+    """Returns the max, sum and average of one stat over a user's logged activities for an exercise, grouped by day, week or month"""
+    if stat_name not in STAT_COLUMNS or bucket not in BUCKETS:
+        raise ValueError(f"Unknown stat '{stat_name}' or bucket '{bucket}'")
+    stat = STAT_COLUMNS[stat_name]
+    period = func.date_trunc(bucket, Activity.datetime)
+    rows = (logged_activities(user_id, exercise_id, since, until)
+                    .with_entities(period.label('datetime'),
+                            func.max(stat).label('max'),
+                            cast(func.sum(stat), db.Float).label('sum'),
+                            cast(func.avg(stat), db.Float).label('avg'),
+                            func.count(stat).label('count'))
+                    .filter(stat.isnot(None))
+                    .group_by(period)
+                    .order_by(period)
+                    .all())
+    return records(rows)
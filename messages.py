@@ -5,3 +5,6 @@ redundant_login_message = "You are already logged in.  To switch accounts, pleas
 authentication_failure_message = "Login failed. Check your username and password and try again."
 unauthorized_access_message = "You are not authorized to access this page."
 unauthorized_edit_message = "You are not authorized to modify this page."
+invalid_query_message = "The request contains an invalid query parameter."
+exercise_info_unavailable_message = "Exercise details are unavailable right now.  Please try again later."
+login_busy_message = "We are handling a lot of logins right now.  Please try again in a moment."
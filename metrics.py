@@ -0,0 +1,75 @@
+"""Prometheus metrics for the app, served at /metrics.
+
+Under gunicorn every worker process records into files in PROMETHEUS_MULTIPROC_DIR (set up by gunicorn.conf.py), and
+whichever worker answers /metrics merges them, so counts and histograms cover all workers.  Without the variable
+(flask run, tests) the metrics live in this process.
+"""
+import os
+import time
+
+from flask import g, request
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                    CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+from sqlalchemy import event
+
+REQUESTS = Counter('http_requests_total', "Requests handled, by endpoint, method and status",
+                    ['endpoint', 'method', 'status'])
+REQUEST_DURATION = Histogram('http_request_duration_seconds', "Time to handle a request, by endpoint and method",
+                    ['endpoint', 'method'],
+                    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+POOL_CHECKED_OUT = Gauge('db_pool_checked_out', "Database connections currently checked out of the pool",
+                    multiprocess_mode='livesum')
+POOL_OVERFLOW = Gauge('db_pool_overflow', "Database connections open beyond the pool size",
+                    multiprocess_mode='livesum')
+CACHE_REQUESTS = Counter('cache_requests_total', "Cache lookups, by cache and result (hit, stale or miss)",
+                    ['cache', 'result'])
+PASSWORD_HASH_DURATION = Histogram('password_hash_seconds', "Time spent running bcrypt, by operation (hash or verify)",
+                    ['operation'],
+                    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5))
+PASSWORD_HASH_REJECTED = Counter('password_hash_rejected_total', "Hashes refused because the hashing queue was full")
+
+def registry():
+    """Returns the registry to expose: one merging every worker's files under gunicorn, otherwise this process's"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        merged = CollectorRegistry()
+        multiprocess.MultiProcessCollector(merged)
+        return merged
+    return REGISTRY
+
+def render():
+    """Returns the metrics in the Prometheus text format, and their content type"""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+def track_pool(engine):
+    """Keeps the pool gauges current as connections are checked out and returned.
+
+    The pool is looked up on each event because engine.dispose() replaces it (the listeners carry over).
+    """
+
+    @event.listens_for(engine, 'checkout')
+    def count_checkout(*args):
+        POOL_CHECKED_OUT.inc()
+        POOL_OVERFLOW.set(max(engine.pool.overflow(), 0))
+
+    @event.listens_for(engine, 'checkin')
+    def count_checkin(*args):
+        POOL_CHECKED_OUT.dec()
+        POOL_OVERFLOW.set(max(engine.pool.overflow(), 0))
+
+def init_app(app, db):
+    """Records the count and duration of every request, and tracks the app's connection pool"""
+    with app.app_context():
+        track_pool(db.engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+            REQUEST_DURATION.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        return response
@@ -0,0 +1,43 @@
+"""require datetimes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 12:02:41.310522
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+UTC_NOW = sa.text("timezone('utc', now())")
+
+
+def upgrade():
+    # Pages are ordered by (datetime, id), so fill in missing datetimes: a workout's from its first activity, an
+    # activity's from its workout, and anything left from the time of the migration
+    op.execute("""
+        UPDATE workouts SET datetime = first_activity.datetime
+        FROM (SELECT workout_activities.workout_id, min(activities.datetime) AS datetime
+              FROM workout_activities JOIN activities ON activities.id = workout_activities.activity_id
+              GROUP BY workout_activities.workout_id) AS first_activity
+        WHERE workouts.id = first_activity.workout_id AND workouts.datetime IS NULL
+    """)
+    op.execute("""
+        UPDATE activities SET datetime = workouts.datetime
+        FROM workout_activities JOIN workouts ON workouts.id = workout_activities.workout_id
+        WHERE activities.id = workout_activities.activity_id AND activities.datetime IS NULL
+    """)
+    for table in ('workouts', 'activities'):
+        op.execute(f"UPDATE {table} SET datetime = timezone('utc', now()) WHERE datetime IS NULL")
+        op.alter_column(table, 'datetime', existing_type=sa.DateTime(), nullable=False, server_default=UTC_NOW)
+
+
+def downgrade():
+    for table in ('workouts', 'activities'):
+        op.alter_column(table, 'datetime', existing_type=sa.DateTime(), nullable=True, server_default=None)
@@ -1,10 +1,11 @@
 from datetime import datetime
 
-from flask_bcrypt import Bcrypt
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import exc
 
-bcrypt = Bcrypt()
+from fast_json import records
+from passwords import password_hasher
+
 db = SQLAlchemy()
 
 def connect_db(app):
@@ -29,7 +30,7 @@ class User(db.Model):
     def signup(cls, username, email, password):
         """ Sign up user. Hashes password and adds user to system. """
 
-        hashed_password = bcrypt.generate_password_hash(password).decode('UTF-8')
+        hashed_password = password_hasher.hash(password)
 
         try: 
             user = User(
@@ -51,13 +52,18 @@ class User(db.Model):
 
         If a matching user is found and password is verified, returns True.
         Otherwise, returns False
+        Passwords hashed with a different work factor than the configured one are rehashed.
+        Raises passwords.HashingQueueFull if too many hashes are already pending.
         """
 
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = password_hasher.verify(user.password, password)
             if is_auth:
+                if password_hasher.needs_rehash(user.password):
+                    user.password = password_hasher.hash(password)
+                    db.session.commit()
                 return user
 
         return False
@@ -78,9 +84,37 @@ class Exercise(db.Model):
     def serialize(self):
         return {'id': self.id, 'name': self.name, 'type': self.type}
 
+class Exercise_Info(db.Model):
+
+    __tablename__ = 'exercise_info'
+
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id', ondelete='cascade'), primary_key=True)
+    details = db.Column(db.JSON, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<Exercise_Info {self.exercise_id} fetched {self.fetched_at}>"
+
+class Catalog_Sync_Page(db.Model):
+    """Validators from the last sync of one page of the upstream exercise list, for conditional requests"""
+
+    __tablename__ = 'catalog_sync_pages'
+
+    url = db.Column(db.Text, primary_key=True)
+    etag = db.Column(db.Text)
+    last_modified = db.Column(db.Text)
+    next_url = db.Column(db.Text)
+    synced_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<Catalog_Sync_Page {self.url} synced {self.synced_at}>"
+
 class Activity(db.Model):
 
     __tablename__ = 'activities'
+    __table_args__ = (
+        db.Index('ix_activities_performed_by_exercise_id_datetime', 'performed_by', 'exercise_id', 'datetime', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     performed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -93,7 +127,7 @@ class Activity(db.Model):
     duration_units = db.Column(db.Text)
     distance = db.Column(db.Text)
     distance_units = db.Column(db.Text)
-    datetime = db.Column(db.DateTime, default=datetime.utcnow())
+    datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.text("timezone('utc', now())"))
 
     def serialize(self):
         return {'id': self.id, 
@@ -111,11 +145,15 @@ class Activity(db.Model):
 class Workout(db.Model):
 
     __tablename__ = 'workouts'
+    __table_args__ = (
+        db.Index('ix_workouts_creator_datetime', 'creator', 'datetime', 'id'),
+        db.Index('ix_workouts_shared_datetime', 'datetime', 'id', postgresql_where=db.text('NOT is_private')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     creator = db.Column(db.Integer, db.ForeignKey('users.id'))
     name = db.Column(db.Text, default="Workout")
-    datetime = db.Column(db.DateTime, default=datetime.utcnow())
+    datetime = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=db.text("timezone('utc', now())"))
     is_private = db.Column(db.Boolean, default=True)
     is_logged = db.Column(db.Boolean, default=True)
 
@@ -134,18 +172,111 @@ class Workout(db.Model):
             'name': self.name, 
             }
     
-    def get_unique_exercises(self):
-        """Returns the exercise names within the workout without any repeats"""
-        unique_exercises = set()
-        for activity in self.workout_activities:
-            unique_exercises.add(activity.exercise.name)
-        return list(unique_exercises)
+    def serialize_activities(self):
+        """Returns the workout's serialized activities, with exercise names, from a single joined query"""
+        activities = (db.session.query(Activity.id,
+                            Exercise.name.label('exercise'),
+                            Activity.sets,
+                            Activity.reps,
+                            Activity.weight,
+                            Activity.duration,
+                            Activity.distance)
+                        .join(Workout_Activity, Workout_Activity.activity_id == Activity.id)
+                        .join(Exercise, Exercise.id == Activity.exercise_id)
+                        .filter(Workout_Activity.workout_id == self.id)
+                        .order_by(Activity.datetime.desc(), Activity.id)
+                        .all())
+        return records(activities)
+
+    def clone(self, user_id):
+        """Copies the workout and its activities to the given user, within the current transaction.
+
+        The activities are copied and linked to the new workout by one INSERT ... SELECT statement.
+        """
+        cloned_workout = Workout(creator=user_id, name=self.name, is_private=True, is_logged=True)
+        db.session.add(cloned_workout)
+        db.session.flush()
+        copied_columns = ['exercise_id', 'weight', 'weight_units', 'reps', 'sets',
+                            'duration', 'duration_units', 'distance', 'distance_units']
+        source_activities = (db.select([db.literal(user_id)] + [getattr(Activity, column) for column in copied_columns])
+                        .join(Workout_Activity, Workout_Activity.activity_id == Activity.id)
+                        .where(Workout_Activity.workout_id == self.id))
+        cloned_activities = (db.insert(Activity)
+                        .from_select(['performed_by'] + copied_columns, source_activities)
+                        .returning(Activity.id)
+                        .cte('cloned_activities'))
+        db.session.execute(db.insert(Workout_Activity)
+                        .from_select(['workout_id', 'activity_id'],
+                            db.select([db.literal(cloned_workout.id), cloned_activities.c.id])))
+        return cloned_workout
+
+    @staticmethod
+    def load_cards(workouts):
+        """Returns the creator's username and the unique exercise names for each workout in a page of workouts.
+
+        Uses one query for the exercise names and one for the usernames, however many workouts there are.
+        """
+        workout_ids = [workout.id for workout in workouts]
+        cards = {workout.id: {'creator': None, 'exercises': []} for workout in workouts}
+        if not workout_ids:
+            return cards
+        exercise_names = (db.session.query(Workout_Activity.workout_id, Exercise.name)
+                        .join(Activity, Activity.id == Workout_Activity.activity_id)
+                        .join(Exercise, Exercise.id == Activity.exercise_id)
+                        .filter(Workout_Activity.workout_id.in_(workout_ids))
+                        .distinct()
+                        .order_by(Workout_Activity.workout_id, Exercise.name))
+        for workout_id, exercise_name in exercise_names:
+            cards[workout_id]['exercises'].append(exercise_name)
+        creator_ids = {workout.creator for workout in workouts}
+        usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(creator_ids)))
+        for workout in workouts:
+            cards[workout.id]['creator'] = usernames.get(workout.creator)
+        return cards
 
 
 class Workout_Activity(db.Model):
 
     __tablename__ = 'workout_activities'
+    __table_args__ = (
+        db.UniqueConstraint('workout_id', 'activity_id', name='uq_workout_activities_workout_id_activity_id'),
+        db.Index('ix_workout_activities_activity_id', 'activity_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     activity_id = db.Column(db.Integer, db.ForeignKey('activities.id'))
     workout_id = db.Column(db.Integer, db.ForeignKey('workouts.id'))
+
+class User_Exercise_Stats(db.Model):
+    """Summary of a user's logged activities for one exercise, maintained by exercise_stats.refresh_exercise_stats"""
+
+    __tablename__ = 'user_exercise_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='cascade'), primary_key=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey('exercises.id', ondelete='cascade'), primary_key=True)
+    first_performed = db.Column(db.DateTime, nullable=False)
+    last_performed = db.Column(db.DateTime, nullable=False)
+    session_count = db.Column(db.Integer, nullable=False)
+    activity_count = db.Column(db.Integer, nullable=False)
+    best_weight = db.Column(db.Integer)
+    best_reps = db.Column(db.Integer)
+    total_volume = db.Column(db.Float)
+    total_distance = db.Column(db.Float)
+    total_duration = db.Column(db.BigInteger)
+    # The id of the transaction that last wrote the row, so it changes whenever the pair's logged activities do
+    version = db.Column(db.BigInteger, nullable=False, server_default='0')
+
+    def __repr__(self):
+        return f"<User_Exercise_Stats user {self.user_id} exercise {self.exercise_id}: {self.session_count} sessions>"
+
+    def serialize(self):
+        return {'first_performed': self.first_performed,
+            'last_performed': self.last_performed,
+            'session_count': self.session_count,
+            'activity_count': self.activity_count,
+            'best_weight': self.best_weight,
+            'best_reps': self.best_reps,
+            'total_volume': self.total_volume,
+            'total_distance': self.total_distance,
+            'total_duration': self.total_duration,
+            }
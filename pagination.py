@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(row_datetime, row_id):
+    """Encodes the (datetime, id) position of a row as a cursor string"""
+    return f"{row_datetime.isoformat()},{row_id}"
+
+def decode_cursor(cursor):
+    """Decodes a cursor string into the (datetime, id) position it was made from"""
+    row_datetime, row_id = cursor.split(',')
+    return (datetime.fromisoformat(row_datetime), int(row_id))
+
+def keyset_page(query, datetime_column, id_column, after=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """Returns one page of a query's rows in (datetime, id) order, and the cursor for the next page (None on the last page).
+
+    Pages start after the position in the 'after' cursor, so the cost of a page does not grow with how far in it is.
+    Raises ValueError for a malformed cursor or a page size below 1.
+    """
+    if limit < 1:
+        raise ValueError("Page size must be positive")
+    limit = min(limit, MAX_PAGE_SIZE)
+    position = tuple_(datetime_column, id_column)
+    if after:
+        start = tuple_(*decode_cursor(after))
+        query = query.filter(position < start if descending else position > start)
+    if descending:
+        query = query.order_by(datetime_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(datetime_column, id_column)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], datetime_column.key), getattr(rows[-1], id_column.key))
+    return rows, next_cursor
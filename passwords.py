@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_bcrypt import Bcrypt
+
+from metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_REJECTED
+
+bcrypt = Bcrypt()
+
+DEFAULT_LOG_ROUNDS = 12
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_DEPTH = 8
+
+class HashingQueueFull(Exception):
+    """Raised when too many password hashes are already running or waiting, so the caller should shed the request"""
+
+def hash_cost(hashed_password):
+    """Returns the bcrypt work factor a hash was made with, or None if it is not a bcrypt hash"""
+    try:
+        return int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+def pool_class():
+    """Returns gevent's native thread pool executor when threading is monkey-patched, else ThreadPoolExecutor"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return ThreadPoolExecutor
+    if not monkey.is_module_patched('threading'):
+        return ThreadPoolExecutor
+    from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+    return NativeThreadPoolExecutor
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification on a small thread pool with a bounded queue.
+
+    bcrypt releases the GIL, so hashes on the pool run alongside other requests.  A request still holds its thread
+    while its hash runs or waits, so requests beyond the pool and queue fail fast with HashingQueueFull instead of
+    piling up; runtime_config.password_hash_limits keeps that total below the worker's request threads by default.
+    Under gevent the standard pool's threads would be greenlets, and bcrypt would block every request in the worker,
+    so the pool is gevent's native thread pool there (see pool_class).
+    Configured from BCRYPT_LOG_ROUNDS, PASSWORD_HASH_WORKERS and PASSWORD_HASH_QUEUE_DEPTH by init_app.
+    """
+
+    def __init__(self):
+        self.configure()
+
+    def init_app(self, app):
+        self.configure(rounds=app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS),
+                    workers=app.config.get('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS),
+                    queue_depth=app.config.get('PASSWORD_HASH_QUEUE_DEPTH', DEFAULT_QUEUE_DEPTH))
+
+    def configure(self, rounds=DEFAULT_LOG_ROUNDS, workers=DEFAULT_WORKERS, queue_depth=DEFAULT_QUEUE_DEPTH):
+        """Sets the work factor and replaces the pool; threads are only started once hashing is requested.
+
+        The old pool finishes the hashes already given to it and then its threads exit.
+        """
+        self.rounds = rounds
+        if getattr(self, '_executor', None) is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = pool_class()(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.inc()
+            raise HashingQueueFull()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def _timed(self, operation, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            PASSWORD_HASH_DURATION.labels(operation).observe(time.perf_counter() - started)
+
+    def hash(self, password):
+        """Hashes a password with the configured work factor"""
+        return self._run(self._timed, 'hash', bcrypt.generate_password_hash, password, self.rounds).decode('UTF-8')
+
+    def verify(self, hashed_password, password):
+        """Checks a password against a stored hash"""
+        return self._run(self._timed, 'verify', bcrypt.check_password_hash, hashed_password, password)
+
+    def needs_rehash(self, hashed_password):
+        """Returns True if a stored hash was made with a different work factor than the configured one"""
+        return hash_cost(hashed_password) != self.rounds
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,60 @@
+import time
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class RequestStats:
+    """SQL statements issued, and time spent waiting on them, during one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+
+    def server_timing(self):
+        """Returns the value of the Server-Timing header describing this request"""
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} queries", app;dur={total_ms:.2f}'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    """Adds a finished statement to the current request's stats; statements outside a request are not counted"""
+    elapsed = time.perf_counter() - conn.info['statement_started'].pop()
+    stats = g.get('request_stats') if has_request_context() else None
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+@event.listens_for(Engine, 'handle_error')
+def discard_statement_timer(exception_context):
+    """A failed statement never reaches after_cursor_execute, so its start time is dropped here"""
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('statement_started'):
+        conn.info['statement_started'].pop()
+
+def init_app(app):
+    """Adds a Server-Timing header with the SQL statement count and database time to every response.
+
+    Requests at or over SQL_LOG_THRESHOLD_MS of database time, or SQL_LOG_THRESHOLD_QUERIES statements, are logged.
+    """
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def add_server_timing(response):
+        stats = g.get('request_stats')
+        if stats is None:
+            return response
+        response.headers['Server-Timing'] = stats.server_timing()
+        if (stats.db_seconds * 1000 >= app.config['SQL_LOG_THRESHOLD_MS']
+                or stats.statements >= app.config['SQL_LOG_THRESHOLD_QUERIES']):
+            app.logger.warning(f"{request.method} {request.full_path.rstrip('?')}: {stats.statements} queries, "
+                        f"{stats.db_seconds * 1000:.1f}ms in the database")
+        return response
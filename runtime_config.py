@@ -0,0 +1,88 @@
+"""Gunicorn and database pool settings for a deployment, derived from the environment.
+
+Read by gunicorn.conf.py (worker settings) and app.py (SQLALCHEMY_ENGINE_OPTIONS), so the pool always matches
+the concurrency of the worker it runs in:
+ - GUNICORN_WORKER_CLASS: sync, gthread (default) or gevent (needs the gevent and psycogreen packages)
+ - WEB_CONCURRENCY: worker processes (default 2; Heroku sets it from the dyno size)
+ - GUNICORN_THREADS: threads per gthread worker (default 4)
+ - GUNICORN_WORKER_CONNECTIONS: concurrent requests per gevent worker (default 100)
+ - GUNICORN_PRELOAD: import the app once in the master before forking (default on)
+ - DATABASE_MAX_CONNECTIONS: connections the database allows this app across all workers (default 20)
+ - DATABASE_POOL_RECYCLE: seconds before a connection is replaced (default 1800)
+ - DATABASE_STATEMENT_TIMEOUT_MS: server-side limit on any one statement run by a web worker (default 10000)
+ - PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_DEPTH: password hashes run and waiting per worker (see password_hash_limits)
+"""
+import os
+
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+# Connections beyond the request threads, for background work such as exercise info refreshes
+BACKGROUND_CONNECTIONS = 2
+# Most password hashes running at once, and waiting, in one worker by default
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_QUEUE_DEPTH = 8
+# Set by gunicorn.conf.py before the app is imported.  Only web workers get the statement timeout; migrations, flask
+# commands and the data generator run long statements (index builds, backfills, summary rebuilds) on the same engine.
+serving_web = False
+
+def serve_web():
+    """Marks this process, and the workers forked from it, as serving web requests"""
+    global serving_web
+    serving_web = True
+
+def env_int(env, name, default):
+    return int(env.get(name, default))
+
+def worker_settings(env=os.environ):
+    """Returns the gunicorn worker settings for the environment"""
+    worker_class = env.get('GUNICORN_WORKER_CLASS', 'gthread')
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}")
+    return {
+        'worker_class': worker_class,
+        'workers': env_int(env, 'WEB_CONCURRENCY', 2),
+        'threads': env_int(env, 'GUNICORN_THREADS', 4) if worker_class == 'gthread' else 1,
+        'worker_connections': env_int(env, 'GUNICORN_WORKER_CONNECTIONS', 100),
+        'preload_app': env.get('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'no'),
+    }
+
+def worker_concurrency(settings):
+    """Returns how many requests one worker can be handling at once"""
+    if settings['worker_class'] == 'gevent':
+        return settings['worker_connections']
+    return settings['threads']
+
+def password_hash_limits(env=os.environ):
+    """Returns the default password hashing pool size and queue depth for one worker process.
+
+    A request waiting for a hash holds its request thread (or greenlet), so the hashes running and waiting are kept to
+    half the worker's concurrency: a burst of logins is refused with HashingQueueFull while the other half of the
+    threads still serve every other route.  A sync worker, with one thread, hashes one password at a time.
+    """
+    slots = max(1, worker_concurrency(worker_settings(env)) // 2)
+    workers = min(PASSWORD_HASH_WORKERS, slots)
+    return {
+        'workers': env_int(env, 'PASSWORD_HASH_WORKERS', workers),
+        'queue_depth': env_int(env, 'PASSWORD_HASH_QUEUE_DEPTH', min(PASSWORD_HASH_QUEUE_DEPTH, slots - workers)),
+    }
+
+def engine_options(env=os.environ, web=None):
+    """Returns SQLALCHEMY_ENGINE_OPTIONS sized for one worker process.
+
+    Each worker gets an equal share of DATABASE_MAX_CONNECTIONS.  The pool holds a connection per concurrent request
+    up to that share, and overflow covers background threads while it lasts; gevent workers, which run far more
+    requests than they can have connections, queue for one for up to pool_timeout seconds.  Statements are limited to
+    DATABASE_STATEMENT_TIMEOUT_MS only when serving web requests (web, which defaults to whether serve_web was called).
+    """
+    settings = worker_settings(env)
+    budget = max(1, env_int(env, 'DATABASE_MAX_CONNECTIONS', 20) // settings['workers'])
+    pool_size = min(worker_concurrency(settings), budget)
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': min(BACKGROUND_CONNECTIONS, budget - pool_size),
+        'pool_timeout': 10,
+        'pool_pre_ping': True,
+        'pool_recycle': env_int(env, 'DATABASE_POOL_RECYCLE', 1800),
+    }
+    if serving_web if web is None else web:
+        options['connect_args'] = {'options': f"-c statement_timeout={env_int(env, 'DATABASE_STATEMENT_TIMEOUT_MS', 10000)}"}
+    return options
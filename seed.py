@@ -1,51 +1,26 @@
-from app import db
-from models import User, Exercise, Activity, Workout, Workout_Activity
-from exerciseList import idLookup
+"""Recreates the development database and fills it with generated data.
 
-def batch_insert(entry_list):
-    for element in entry_list:
-        db.session.add(element)
-    db.session.commit()
+    python seed.py                      # a few users with a year or two of workouts each
+    python seed.py --users 5000 --seed 7
 
-db.drop_all()
-db.create_all()
+Takes the same options as datagen.py.  Every user is "user<n>" with the password "password".
+"""
+import argparse
 
-user_1 = User(username="nightcrawler52",email="nightcrawler52@gmail.com",password="password")
-user_2 = User(username="donutdude11",email="donutdude52@gmail.com",password="password")
-user_3 = User(username="amorfeo89",email="amorfeo89@gmail.com",password="password")
+from flask_migrate import stamp
 
-batch_insert([user_1,user_2,user_3])
+from app import app, db
+from datagen import add_arguments, generate
 
-exercise_list = []
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drop, recreate and seed the database.")
+    add_arguments(parser, reset_option=False, users=3, workouts_per_user=40)
+    args = parser.parse_args()
 
-for name,id in idLookup.items():
-    exercise_list.append(Exercise(id=id, name=name,type="Strength"))
-
-# exercise_1 = Exercise(name="Bench Press",type="Strength")
-# exercise_2 = Exercise(name="Running",type="Cardio")
-# exercise_3 = Exercise(name="Cycling",type="Cardio")
-# exercise_4 = Exercise(name="Squats",type="Strength")
-# exercise_5 = Exercise(name="Deadlift",type="Strength")
-# exercise_6 = Exercise(name="Leg Raises",type="Endurance")
-# exercise_7 = Exercise(name="Seated Rows",type="Strength")
-# exercise_8 = Exercise(name="Plank",type="Endurance")
-
-batch_insert(exercise_list)
-
-activity_1 = Activity(performed_by=1,exercise_id=192,weight=20,weight_units="lbs",reps=6,sets=4)
-activity_2 = Activity(performed_by=2,exercise_id=214,duration=40,duration_units="mins",distance=2,distance_units="miles")
-activity_3 = Activity(performed_by=3,exercise_id=105,weight=110,weight_units="kg",reps=8,sets=4)
-
-batch_insert([activity_1,activity_2,activity_3])
-
-workout_1 = Workout(creator=1)
-workout_2 = Workout(creator=2)
-workout_3 = Workout(creator=2)
-
-batch_insert([workout_1,workout_2,workout_3])
-
-workout_activity_1 = Workout_Activity(workout_id=1,activity_id=1)
-workout_activity_2 = Workout_Activity(workout_id=3,activity_id=3)
-workout_activity_3 = Workout_Activity(workout_id=3,activity_id=2)
-
-batch_insert([workout_activity_1,workout_activity_2,workout_activity_3])
\ No newline at end of file
+    db.drop_all()
+    db.create_all()
+    with app.app_context():
+        stamp()
+    print(generate(args.users, args.exercises, args.workouts_per_user, args.activities_per_workout,
+                shared_fraction=args.shared_fraction, logged_fraction=args.logged_fraction,
+                years=args.years, seed=args.seed))
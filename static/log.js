@@ -4,35 +4,49 @@ class App {
         this.workouts = [];
         this.base_url = $('#base-url').data('url');
     }
-    fetchWorkouts() {
-        const $workoutDivs = $("div.tags").each(function(idx) {
+    fetchWorkouts($container=$(document)) {
+        const $workoutDivs = $container.find("div.tags").each(function(idx) {
             const workoutId = $(this).data('id');
             const workoutInstance = new Workout(workoutId);
             workoutInstance.addTagEvents();
             app.workouts.push(workoutInstance);
         });
     }
+    addLoadMoreEvent() {
+        /* Load the next page of workouts in place, rather than navigating to it */
+        $('a.load-more').on('click', this.loadMore.bind(this));
+    }
+    async loadMore(e) {
+        /* Fetch the next page, append its workouts and replace the Load More link with the next page's */
+        e.preventDefault();
+        const resp = await axios.get(e.target.href);
+        const $nextPage = $('<div></div>').append($.parseHTML(resp.data));
+        const $cards = $nextPage.find('.workout-card, .log-card');
+        const $nextLoadMore = $nextPage.find('a.load-more');
+        $('a.load-more').before($cards);
+        if ($nextLoadMore.length) {
+            $('a.load-more').replaceWith($nextLoadMore);
+        } else {
+            $('a.load-more').remove();
+        };
+        this.fetchWorkouts($cards);
+        this.addLoadMoreEvent();
+    }
 }
 
 class Log {
     constructor() {
         this.$log = $('<div class="logbook"></div>');
-        this.exerciseLookup = {};
     }
     async start() {
-        const exercise_resp = await axios.get(`${app.base_url}/api/exercises`);
-        const allExercises = exercise_resp['data']['exercises'];
-        for (let exercise of allExercises) {
-            this.exerciseLookup[exercise['name']] = exercise['type'];
-        };
-        const exerciseList = Object.keys(app.log.exerciseLookup);
-        exerciseList.sort();
-        const exerciseDropdown = createStatElement('Exercise',this.exercise,exerciseList);
-        this.$log.append(exerciseDropdown);
+        const exerciseSearch = createExerciseElement();
+        this.$log.append(exerciseSearch);
+        this.$log.append($('<datalist id="exercise-options"></datalist>'));
         this.$results = $('<div class="div-card results"><p class="low-margin">Select an Exercise to View Logs</p></div>');
         this.$log.append(this.$results);
         $('main').prepend(this.$log);
-        $('select').on('change',handleChange.bind(this))
+        $('input.exercise-search').on('input',suggestExercises);
+        $('input.exercise-search').on('change',handleChange.bind(this))
     }
     buildTable(json_response) {
         const $table = $('<table></table>');
@@ -45,7 +59,14 @@ class Log {
         }
         const $tableBody = $('<tbody></tbody>');
         $table.append($tableHeader);
-        for (let datum of json_response['data']['stats']) {
+        $tableBody.append(this.buildRows(json_response['data']['stats']));
+        $table.append($tableBody);
+        return $table;
+    }
+    buildRows(stats) {
+        /* Build a table row for each logged stat */
+        const tableRows = [];
+        for (let datum of stats) {
             const $tableRow = $(`<tr></tr>`);
             const $dateDatum = $(`<td class="date"><div class="cell"><p>${datum['datetime']}</p></div></td>`);
             $tableRow.append($dateDatum);
@@ -53,10 +74,24 @@ class Log {
                 const $tableData = datum[stat] ? $(`<td><div class="cell"><p>${datum[stat]}</p></div></td>`) : $(`<td><div class="cell"></div></td>`);
                 $tableRow.append($tableData);
             }
-            $tableBody.append($tableRow);
+            tableRows.push($tableRow);
         };
-        $table.append($tableBody);
-        return $table;
+        return tableRows;
+    }
+    addLoadMoreButton(exerciseName,cursor) {
+        /* Offer the next page of logs, if there is one */
+        $('.results button.load-more').remove();
+        if (!cursor) {
+            return;
+        };
+        const $loadMoreButton = $('<button class="load-more">Load More</button>');
+        $loadMoreButton.on('click', async (e) => {
+            e.preventDefault();
+            const response = await axios.get(`${app.base_url}/api/users/logs/${exerciseName}`,{params: {after: cursor}});
+            $('.results tbody').append(this.buildRows(response['data']['stats']));
+            this.addLoadMoreButton(exerciseName,response['data']['next']);
+        });
+        $('.results').append($loadMoreButton);
     }
     async buildChart(json_response) {
         const chartImage = `https://image-charts.com/chart?cht=ls&chd=s:20_4060809090&chs=700x200&chf=b0,lg,90,03a9f4,0,3f51b5,1`;
@@ -68,52 +103,66 @@ class Log {
         $('main').append(logDiv);
         logDiv.append(this.$log);
     }
-    async fetchAllData() {
-        const exercise_resp = await axios.get(`${app.base_url}/api/exercises`);
-        const allExercises = exercise_resp['data']['exercises'];
-        for (let exercise of allExercises) {
-            this.exerciseLookup[exercise['name']] = exercise['type'];
-        };
+};
+
+const createExerciseElement = () => {
+    /* Create the exercise input, which suggests matching exercises as the user types */
+    return $(
+        `<div class="stat">
+            <input type="search" id="exercise" name="exercise" list="exercise-options" autocomplete="off" class="exercise-search" />
+            <label class="stat-label" for="exercise">Exercise</label>
+        </div>`)
+};
+
+let exerciseSearchTimer = null;
+
+const suggestExercises = (e) => {
+    /* Fill the list of suggestions with the server's best matches for what has been typed, once typing pauses */
+    const query = e.target.value;
+    clearTimeout(exerciseSearchTimer);
+    exerciseSearchTimer = setTimeout(async () => {
+        const resp = await axios.get(`${app.base_url}/api/exercises/search`,{params: {q: query}});
+        const $options = resp['data']['exercises'].map((exercise) => $('<option></option>').attr('value',exercise['name']));
+        $('#exercise-options').empty().append($options);
+    }, 150);
+};
+
+const resolveExercise = async (name) => {
+    /* Return the catalog's name for the exercise typed, or null if no exercise has that name */
+    const query = name.trim().toLowerCase();
+    if (!query) {
+        return null;
     };
+    const resp = await axios.get(`${app.base_url}/api/exercises/search`,{params: {q: query, limit: 1}});
+    const [match] = resp['data']['exercises'];
+    return match && match['name'].toLowerCase() == query ? match['name'] : null;
 };
 
-const createStatElement = (label,value,optionsList=null) => {
-    if (optionsList != null) {
-        options = ``;
-        for (option of optionsList) {
-            if (option == value) {
-                options = options.concat(`\n<option value="${option}" selected="selected">${option}</option>`)
-            } else {
-                options = options.concat(`\n<option value="${option}">${option}</option>`)
-            };
-        };
-        //Redo as reduce
-        return $(
-            `<div class="stat">
-                <select id="exercise" name="exercise">
-                    ${options}
-                </select>
-                <label class="stat-label" for="${label}">${label}</label>
-            </div>`)
+const checkExercise = async (input) => {
+    /* Replace the input's value with the exercise it names, or mark it invalid; returns the exercise name or null */
+    const exerciseName = await resolveExercise(input.value);
+    input.setCustomValidity(exerciseName ? '' : 'Choose an exercise from the list');
+    if (exerciseName) {
+        input.value = exerciseName;
     } else {
-        return $(
-            `<div class="stat">
-                <input type="number" id="${label}" value="${value}" name="${label.toLowerCase()}" class="stat-value" />
-                <label class="stat-label" for="${label}">${label}</label>
-            </div>`)
+        input.reportValidity();
     };
+    return exerciseName;
 };
 
 async function handleChange(e) {
     e.preventDefault();
     const $results = $('.results');
+    const exerciseName = await checkExercise(e.target);
+    if (!exerciseName) {
+        return;
+    };
     $results.empty();
-    const json_request = {};
-    json_request[e.target.name] = e.target.value;
-    const response = await axios.get(`${app.base_url}/api/users/logs/${e.target.value}`);
+    const response = await axios.get(`${app.base_url}/api/users/logs/${exerciseName}`);
     const dataTable = this.buildTable(response);
-    $results.append($(`<p class="low-margin">${e.target.value}</p>`))
+    $results.append($(`<p class="low-margin">${exerciseName}</p>`))
     $results.append(dataTable);
+    this.addLoadMoreButton(exerciseName,response['data']['next']);
     // const chart = await this.buildChart(response);
     // $results.append(chart);
 };
@@ -158,4 +207,5 @@ class Workout {
 
 const app = new App();
 app.fetchWorkouts();
+app.addLoadMoreEvent();
 app.log.start();
\ No newline at end of file
@@ -4,14 +4,34 @@ class App {
         this.workouts = [];
         this.base_url = $('#base-url').data('url');
     }
-    fetchWorkouts() {
-        const $workoutDivs = $("div.tags").each(function(idx) {
+    fetchWorkouts($container=$(document)) {
+        const $workoutDivs = $container.find("div.tags").each(function(idx) {
             const workoutId = $(this).data('id');
             const workoutInstance = new Workout(workoutId);
             workoutInstance.addTagEvents();
             app.workouts.push(workoutInstance);
         });
     }
+    addLoadMoreEvent() {
+        /* Load the next page of workouts in place, rather than navigating to it */
+        $('a.load-more').on('click', this.loadMore.bind(this));
+    }
+    async loadMore(e) {
+        /* Fetch the next page, append its workouts and replace the Load More link with the next page's */
+        e.preventDefault();
+        const resp = await axios.get(e.target.href);
+        const $nextPage = $('<div></div>').append($.parseHTML(resp.data));
+        const $cards = $nextPage.find('.workout-card, .log-card');
+        const $nextLoadMore = $nextPage.find('a.load-more');
+        $('a.load-more').before($cards);
+        if ($nextLoadMore.length) {
+            $('a.load-more').replaceWith($nextLoadMore);
+        } else {
+            $('a.load-more').remove();
+        };
+        this.fetchWorkouts($cards);
+        this.addLoadMoreEvent();
+    }
 }
 
 class Workout {
@@ -53,4 +73,5 @@ class Workout {
 };
 
 app = new App();
-app.fetchWorkouts();
\ No newline at end of file
+app.fetchWorkouts();
+app.addLoadMoreEvent();
\ No newline at end of file
@@ -12,8 +12,9 @@ class Workout {
         this.activities = [];
         this.id = $("#workout-identifier").data('workoutid')
         this.$workout = $('<div class="workout"></div>');
-        this.exerciseLookup = {};
         this.name = $("#workout-identifier input").val();
+        this.pendingUpdates = {};
+        this.batchTimer = null;
     }
     renderWorkout() {
         /* Render the HTML of the workout */
@@ -28,6 +29,7 @@ class Workout {
         workoutDiv.append(this.$workout);
         workoutDiv.append(this.form.$form);
         $('main').append($('<div class="exercise-info div-card"></div>'));
+        $('main').append($('<datalist id="exercise-options"></datalist>'));
         $('.exercise-info').hide();
         for (let activity of this.activities) {
             activity.toggleStatDisplay();
@@ -35,18 +37,12 @@ class Workout {
         $('.activity.logged input.stat-value').each(function() {
             $(this).on('change',handleChange)
         });
-        $('.activity.logged select').each(function() {
+        $('.activity.logged input.exercise-search').each(function() {
             $(this).on('change',handleChange)
         });
         $("#workout-identifier input").on('change',this.updateWorkoutName)
         this.addTagEvents();
     }
-    async getExerciseDetails(e) {
-        /* Fetch the list of exercises in the database */
-        e.preventDefault();
-        const resp = await axios.get(`${app.base_url}/api/exercises`);
-        
-    }
     async updateWorkoutName(e) {
         /* Communicate with the database API to change the name of the workout */
         e.preventDefault();
@@ -56,11 +52,6 @@ class Workout {
     }
     async fetchAllData() {
         /* Fetch all existing data for the workout from the database API */
-        const exercise_resp = await axios.get(`${app.base_url}/api/exercises`);
-        const allExercises = exercise_resp['data']['exercises'];
-        for (let exercise of allExercises) {
-            this.exerciseLookup[exercise['name']] = exercise['type'];
-        };
         const activity_resp = await axios.get(`${app.base_url}/api/workouts/${this.id}/activities`);
         const activities = activity_resp['data'][`activities`];
         for (const activity of activities) {
@@ -69,6 +60,64 @@ class Workout {
         };
         this.renderWorkout();
     }
+    queueUpdate(activityId,field,value) {
+        /* Collect changes to activities, to be sent as one batch once editing pauses */
+        const pendingUpdate = this.pendingUpdates[activityId] || {op: 'update', id: activityId};
+        pendingUpdate[field] = value;
+        this.pendingUpdates[activityId] = pendingUpdate;
+        clearTimeout(this.batchTimer);
+        this.batchTimer = setTimeout(this.sendBatch.bind(this), 500);
+    }
+    takePendingOperations() {
+        /* Remove and return the queued activity changes */
+        clearTimeout(this.batchTimer);
+        const operations = Object.values(this.pendingUpdates);
+        this.pendingUpdates = {};
+        return operations;
+    }
+    requeueOperations(operations) {
+        /* Put changes that were not saved back in the queue, under any made since they were taken */
+        const activityIds = new Set(this.activities.map((activity) => activity.id));
+        for (const operation of operations.filter((operation) => activityIds.has(operation.id))) {
+            this.pendingUpdates[operation.id] = {...operation, ...this.pendingUpdates[operation.id]};
+        };
+    }
+    showBatchError(message) {
+        /* Show why queued changes were not saved, or clear the message once a batch succeeds */
+        $('.batch-error').remove();
+        if (message) {
+            this.$workout.after($('<p class="batch-error low-margin"></p>').text(message));
+        };
+    }
+    async sendBatch() {
+        /* Communicate all queued activity changes to the database API in one request */
+        const operations = this.takePendingOperations();
+        if (!operations.length) {
+            return;
+        };
+        try {
+            await axios.post(`${app.base_url}/api/workouts/${this.id}/activities/batch`,{operations});
+            this.showBatchError(null);
+        } catch (error) {
+            /* The batch is all or nothing, so none of it was saved.  Keep it to send with the next change unless the
+               server rejected it (a 4xx), which would only happen again */
+            const response = error.response;
+            if (!response || response.status >= 500) {
+                this.requeueOperations(operations);
+                this.showBatchError('Your changes could not be saved yet; they will be sent with your next change.');
+            } else {
+                this.showBatchError(`Your changes were not saved: ${response.data['response'] || response.statusText}`);
+            };
+        };
+    }
+    sendBatchOnExit() {
+        /* Send any queued activity changes as the page is closed */
+        const operations = this.takePendingOperations();
+        if (operations.length) {
+            const body = new Blob([JSON.stringify({operations})], {type: 'application/json'});
+            navigator.sendBeacon(`${app.base_url}/api/workouts/${this.id}/activities/batch`,body);
+        };
+    }
     addToWorkout(activity) {
         /* Add an instance of Activity Class to the workout and render its HTML */
         this.activities.push(activity);
@@ -116,9 +165,7 @@ class ActivityForm {
     generateForm() {
         /* Renders the HTML for the form to create a new activity */
         const $form = $('<form class="activity new"></form>');
-        const exerciseList = Object.keys(app.workout.exerciseLookup);
-        exerciseList.sort();
-        const exerciseText = createStatElement('Exercise',"",exerciseList);
+        const exerciseText = createExerciseElement("");
         const setsText = createStatElement('Sets',"");
         const repsText = createStatElement('Reps',"");
         const weightText = createStatElement('Weight',"");
@@ -203,19 +250,20 @@ class Activity {
     async deleteActivity(e) {
         /* Delete an activity through the database API and remove from HTML */
         e.preventDefault();
+        delete app.workout.pendingUpdates[this.id];
         const resp = await axios.get(`${app.base_url}/api/activities/${this.id}/delete`);
         $(`div[data-id='${this.id}']`).parent().remove();
         const indexToRemove = app.workout.activities.indexOf(this);
         app.workout.activities.splice(indexToRemove,1);
     }
     async requestInfo(e) {
-        /* Request exercise info from the Wger API and display the information */
+        /* Request exercise info (cached from the Wger API) and display the information */
         e.preventDefault();
         const activityId = e.target.parentElement.parentElement.dataset.id;
-        const exerciseName = $(`div[data-id=${activityId}] select option:selected`).val();
+        const exerciseName = $(`div[data-id=${activityId}] input.exercise-search`).val();
         const resp = await axios.get(`${app.base_url}/api/exercises/${exerciseName}`)
         const exerciseId = resp.data.exercise.id;
-        const apiResponse = await axios.get(`https://wger.de/api/v2/exerciseinfo/${exerciseId}`);
+        const apiResponse = await axios.get(`${app.base_url}/api/exercises/${exerciseId}/info`);
         const exerciseDescription = apiResponse.data.description;
         const exerciseMuscles = apiResponse.data.muscles;
         const exerciseEquipment = apiResponse.data.equipment;
@@ -227,10 +275,8 @@ class Activity {
         /* Generate the HTML for an Activity */
         const activityDiv = $('<div class="activity logged"></div>');
         const infoDiv = $(`<div class="info" data-id="${this.id}"></div>`);
-        const exerciseList = Object.keys(app.workout.exerciseLookup);
-        exerciseList.sort();
         const $statDiv = $(`<div class="stats"></div>`);
-        const exerciseText = createStatElement('Exercise',this.exercise,exerciseList);
+        const exerciseText = createExerciseElement(this.exercise);
         const setsText = createStatElement('Sets',this.sets);
         const repsText = createStatElement('Reps',this.reps);
         const weightText = createStatElement('Weight',this.weight);
@@ -259,31 +305,60 @@ class Activity {
     }
 };
 
-const createStatElement = (label,value,optionsList=null) => {
+const createStatElement = (label,value) => {
     /* Helper function to create a Stat HTML element */
-    if (optionsList != null) {
-        options = ``;
-        for (option of optionsList) {   //Redo as reduce
-            if (option == value) {
-                options = options.concat(`\n<option value="${option}" selected="selected">${option}</option>`)
-            } else {
-                options = options.concat(`\n<option value="${option}">${option}</option>`)
-            };
-        };
-        return $(
-            `<div class="stat">
-                <select id="exercise" name="exercise">
-                    ${options}
-                </select>
-                <label class="stat-label" for="${label}">${label}</label>
-            </div>`)
+    return $(
+        `<div class="stat">
+            <input type="number" id="${label}" value="${value}" name="${label.toLowerCase()}" min="0" class="stat-value" />
+            <label class="stat-label" for="${label}">${label}</label>
+        </div>`)
+};
+
+const createExerciseElement = (value) => {
+    /* Helper function to create the exercise input, which suggests matching exercises as the user types */
+    const $exercise = $(
+        `<div class="stat">
+            <input type="search" id="exercise" name="exercise" list="exercise-options" autocomplete="off" class="exercise-search" />
+            <label class="stat-label" for="exercise">Exercise</label>
+        </div>`);
+    $exercise.find('input').val(value);
+    return $exercise;
+};
+
+let exerciseSearchTimer = null;
+
+const suggestExercises = (e) => {
+    /* Fill the shared list of suggestions with the server's best matches for what has been typed, once typing pauses */
+    const query = e.target.value;
+    clearTimeout(exerciseSearchTimer);
+    exerciseSearchTimer = setTimeout(async () => {
+        const resp = await axios.get(`${app.base_url}/api/exercises/search`,{params: {q: query}});
+        const $options = resp['data']['exercises'].map((exercise) => $('<option></option>').attr('value',exercise['name']));
+        $('#exercise-options').empty().append($options);
+    }, 150);
+};
+
+const resolveExercise = async (name) => {
+    /* Return the catalog's name for the exercise typed, or null if no exercise has that name */
+    const query = name.trim().toLowerCase();
+    if (!query) {
+        return null;
+    };
+    const resp = await axios.get(`${app.base_url}/api/exercises/search`,{params: {q: query, limit: 1}});
+    const [match] = resp['data']['exercises'];
+    return match && match['name'].toLowerCase() == query ? match['name'] : null;
+};
+
+const checkExercise = async (input) => {
+    /* Replace the input's value with the exercise it names, or mark it invalid; returns the exercise name or null */
+    const exerciseName = await resolveExercise(input.value);
+    input.setCustomValidity(exerciseName ? '' : 'Choose an exercise from the list');
+    if (exerciseName) {
+        input.value = exerciseName;
     } else {
-        return $(
-            `<div class="stat">
-                <input type="number" id="${label}" value="${value}" name="${label.toLowerCase()}" min="0" class="stat-value" />
-                <label class="stat-label" for="${label}">${label}</label>
-            </div>`)
+        input.reportValidity();
     };
+    return exerciseName;
 };
 
 const generateExerciseHTML = (exerciseName,exerciseDescription,exerciseMuscles,exerciseEquipment) => {
@@ -313,15 +388,16 @@ const generateExerciseHTML = (exerciseName,exerciseDescription,exerciseMuscles,e
 /* Initiate the App */
 const app = new App();
 app.workout.fetchAllData();
+window.addEventListener('pagehide', () => app.workout.sendBatchOnExit());
+$(document).on('input','input.exercise-search',suggestExercises);
 
 async function handleSubmit(e) {
     /* Handle form submission for the new activity form */
     e.preventDefault();
     const $form = $('form');
-    const inputs = $form.serializeArray();
     const json_request = {};
-    let badInput = false;
-    for (let input of inputs) {
+    let badInput = !(await checkExercise($form.find('input.exercise-search')[0]));
+    for (let input of $form.serializeArray()) {
         json_request[input.name] = input.value;
         if (Number(input.value) < 0) {
             badInput = true;
@@ -343,10 +419,12 @@ async function handleSubmit(e) {
 }
 
 async function handleChange(e) {
-    /* Update the activity in the database API if a value changes */
+    /* Queue an update to the activity in the database API if a value changes */
     e.preventDefault();
-    const activity_id = e.target.parentElement.parentElement.dataset.id;
-    const json_request = {};
-    json_request[e.target.name] = e.target.value;
-    const response = await axios.post(`${app.base_url}/api/activities/${activity_id}/update`,json_request);
+    const activity_id = $(e.target).closest('[data-id]').data('id');
+    /* One unknown exercise would fail the whole batch, so only queue names from the catalog */
+    if (e.target.name == 'exercise' && !(await checkExercise(e.target))) {
+        return;
+    };
+    app.workout.queueUpdate(activity_id,e.target.name,e.target.value);
 };
\ No newline at end of file
@@ -1,9 +1,14 @@
 import os
+import threading
 from unittest import TestCase
+from unittest.mock import patch
 
-from models import db, connect_db, User, Exercise, Activity, Workout, Workout_Activity
+from models import db, connect_db, User, Exercise, Activity, Workout, Workout_Activity, User_Exercise_Stats
 from datetime import datetime
 from messages import *
+from prometheus_client import REGISTRY
+from testing import QueryCounter, QueryCountAssertions
+from exercise_stats import rebuild_exercise_stats, refresh_exercise_stats, summary_select
 
 # Declare test database
 os.environ['DATABASE_URL'] = "postgresql:///workoutcompanion-test"
@@ -25,7 +30,7 @@ db.create_all()
 # Disable WTForms use of CSRF during testing.
 app.config['WTF_CSRF_ENABLED'] = False
 
-class ApiTestCase(TestCase):
+class ApiTestCase(QueryCountAssertions, TestCase):
     """Test apis for exercises, workouts, and activities."""
 
     def setUp(self):
@@ -346,6 +351,31 @@ class ApiTestCase(TestCase):
                 'distance': '3333335',
                 }])
     
+    def test_get_activities_query_count(self):
+        """Does requesting a workout's activities issue the same number of queries regardless of workout size? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            exercise2 = Exercise.query.filter_by(name="Test Exercise 2").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            with QueryCounter() as small_workout_queries:
+                resp = c.get(f"/api/workouts/{workout1.id}/activities")
+            self.assertEqual(len(resp.json['activities']),2)
+
+            new_activities = [Activity(performed_by=testuser1.id, exercise_id=exercise2.id, weight=n) for n in range(60)]
+            db.session.add_all(new_activities)
+            db.session.commit()
+            db.session.add_all([Workout_Activity(workout_id=workout1.id, activity_id=activity.id) for activity in new_activities])
+            db.session.commit()
+
+            with QueryCounter() as large_workout_queries:
+                resp = c.get(f"/api/workouts/{workout1.id}/activities")
+            self.assertEqual(len(resp.json['activities']),62)
+            self.assertIn('Test Exercise 2',[activity['exercise'] for activity in resp.json['activities']])
+            self.assertEqual(small_workout_queries.count,large_workout_queries.count)
+
     def test_prevent_anonymous_get_activities(self):
         """Is an anonymous user prevented from getting activities of a workout? """
         with self.client as c:
@@ -394,15 +424,8 @@ class ApiTestCase(TestCase):
             activity1 = Activity.query.filter_by(weight='1111111').first()
             activity3 = Activity.query.filter_by(weight='3333331').first()
             self.assertEqual(resp.status_code,200)
+            # Newest first: the new activity, then the seeded ones
             self.assertEqual(resp.json['activities'],[
-                {'id': activity1.id, 
-                'exercise' : 'Test Exercise 1', 
-                'weight': 1111111,  
-                'reps': 1111112,
-                'sets': 1111113,
-                'duration': 1111114,
-                'distance': '1111115',
-                },
                 {'id': activity4.id,
                  'exercise' : 'Test Exercise 1',
                 "weight": 4444441,
@@ -411,6 +434,14 @@ class ApiTestCase(TestCase):
                 "duration": 4444444,
                 "distance": '4444445',
                 },
+                {'id': activity1.id, 
+                'exercise' : 'Test Exercise 1', 
+                'weight': 1111111,  
+                'reps': 1111112,
+                'sets': 1111113,
+                'duration': 1111114,
+                'distance': '1111115',
+                },
                 {'id': activity3.id,
                  'exercise' : 'Test Exercise 3',
                 'weight': 3333331,
@@ -420,6 +451,24 @@ class ApiTestCase(TestCase):
                 'distance': '3333335',
                 },])
     
+    def test_post_activity_single_transaction(self):
+        """Is a new activity rolled back with its link if refreshing the exercise summary fails? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            workout_id, activity_count = workout1.id, Activity.query.count()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            with patch('app.refresh_exercise_stats', side_effect=RuntimeError("refresh failed")):
+                resp = c.post(f"/api/workouts/{workout_id}/activities",json={"exercise": "Test Exercise 1", "weight": 4444441})
+            db.session.rollback()
+
+            self.assertEqual(resp.status_code,500)
+
+            self.assertEqual(Activity.query.count(),activity_count)
+            self.assertIsNone(Activity.query.filter_by(weight=4444441).first())
+
     def test_prevent_post_activities(self):
         """Is a user prevented from creating a new activity associated with someone else's workout? """
         with self.client as c:
@@ -623,6 +672,39 @@ class ApiTestCase(TestCase):
                 },
                 ])
     
+    def test_patch_activity(self):
+        """Is a partial update applied and returned by one statement, rejecting unknown fields? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            activity1 = Activity.query.filter_by(weight='1111111').first()
+            activity1_id = activity1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+            c.get("/api/exercises")
+            rebuild_exercise_stats()
+
+            with QueryCounter() as queries:
+                resp = c.patch(f"/api/activities/{activity1_id}/update",json={'exercise': 'Test Exercise 2', 'reps': '12'})
+            self.assertEqual(resp.status_code,201)
+            self.assertEqual(resp.json['activity'],{'id': activity1_id, 'exercise': "Test Exercise 2", 'weight': 1111111,
+                                'reps': 12, 'sets': 1111113, 'duration': 1111114, 'distance': '1111115'})
+            activity_statements = [statement for statement in queries.statements if 'activities.' in statement and 'workout' not in statement]
+            self.assertEqual(len(activity_statements),1)
+            self.assertTrue(activity_statements[0].startswith('UPDATE activities'))
+            self.assertSummariesCurrent()
+
+            resp = c.patch(f"/api/activities/{activity1_id}/update",json={'height': 2})
+            self.assertEqual(resp.status_code,400)
+            self.assertEqual(resp.json['response'],"unknown field 'height'")
+            resp = c.patch(f"/api/activities/{activity1_id}/update",json={'reps': 'many'})
+            self.assertEqual(resp.status_code,400)
+            resp = c.patch(f"/api/activities/{activity1_id}/update",json={})
+            self.assertEqual(resp.status_code,400)
+            self.assertEqual(Activity.query.get(activity1_id).reps,12)
+
+            resp = c.patch("/api/activities/999999/update",json={'reps': 1})
+            self.assertEqual(resp.status_code,404)
+
     def test_prevent_update_activities(self):
         """Is a user prevented from updating an activity associated with another workout? """
         with self.client as c:
@@ -668,4 +750,583 @@ class ApiTestCase(TestCase):
                 'duration': 3333334,
                 'distance': '3333335',
                 },
-                ])
\ No newline at end of file
+                ])
+    def test_get_exercise_logs(self):
+        """Can a user request their logged stats for an exercise? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            resp = c.get("/api/users/logs/Test Exercise 1")
+
+            activity1 = Activity.query.filter_by(weight='1111111').first()
+            self.assertEqual(resp.status_code,201)
+            self.assertIsNone(resp.json['next'])
+            self.assertEqual(len(resp.json['stats']),1)
+            self.assertEqual(resp.json['stats'][0]['id'],activity1.id)
+            self.assertEqual(resp.json['stats'][0]['weight'],1111111)
+            self.assertEqual(resp.json['stats'][0]['distance'],'1111115')
+
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            resp = c.get(f"/api/workouts/{workout1.id}/log")
+            resp = c.get("/api/users/logs/Test Exercise 1")
+
+            self.assertEqual(resp.status_code,201)
+            self.assertEqual(resp.json['stats'],[])
+
+    def test_page_exercise_logs(self):
+        """Can a user page through their logged stats for an exercise within a date range? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            exercise4 = Exercise.query.filter_by(name="Test Exercise 4").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            new_activities = [Activity(performed_by=testuser1.id,
+                                exercise_id=exercise4.id,
+                                weight=day,
+                                datetime=datetime(2021,12,day)) for day in range(1,6)]
+            db.session.add_all(new_activities)
+            db.session.commit()
+            db.session.add_all([Workout_Activity(workout_id=workout1.id, activity_id=activity.id) for activity in new_activities])
+            db.session.commit()
+
+            resp = c.get("/api/users/logs/Test Exercise 4?limit=2")
+            self.assertEqual(resp.status_code,201)
+            self.assertEqual([stat['weight'] for stat in resp.json['stats']],[1,2])
+
+            resp = c.get("/api/users/logs/Test Exercise 4",query_string={'limit': 2, 'after': resp.json['next']})
+            self.assertEqual([stat['weight'] for stat in resp.json['stats']],[3,4])
+
+            resp = c.get("/api/users/logs/Test Exercise 4",query_string={'limit': 2, 'after': resp.json['next']})
+            self.assertEqual([stat['weight'] for stat in resp.json['stats']],[5])
+            self.assertIsNone(resp.json['next'])
+
+            resp = c.get("/api/users/logs/Test Exercise 4?since=2021-12-02&until=2021-12-04")
+            self.assertEqual([stat['weight'] for stat in resp.json['stats']],[2,3,4])
+
+            resp = c.get("/api/users/logs/Test Exercise 4?since=yesterday")
+            self.assertEqual(resp.status_code,400)
+            self.assertEqual(resp.json['response'],invalid_query_message)
+
+            resp = c.get("/api/users/logs/Not An Exercise")
+            self.assertEqual(resp.status_code,404)
+
+    def test_get_exercise_stat_aggregates(self):
+        """Can a user request bucketed aggregates of one stat for an exercise? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            exercise4 = Exercise.query.filter_by(name="Test Exercise 4").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            new_activities = [
+                Activity(performed_by=testuser1.id, exercise_id=exercise4.id, weight=100, reps=5, sets=3, distance='1.5', datetime=datetime(2021,12,1,9)),
+                Activity(performed_by=testuser1.id, exercise_id=exercise4.id, weight=120, reps=5, sets=1, distance='far', datetime=datetime(2021,12,1,10)),
+                Activity(performed_by=testuser1.id, exercise_id=exercise4.id, weight=110, reps=8, sets=2, datetime=datetime(2021,12,15,9)),
+                ]
+            db.session.add_all(new_activities)
+            db.session.commit()
+            db.session.add_all([Workout_Activity(workout_id=workout1.id, activity_id=activity.id) for activity in new_activities])
+            db.session.commit()
+
+            resp = c.get("/api/users/logs/Test Exercise 4/weight")
+            self.assertEqual(resp.status_code,201)
+            self.assertEqual(resp.json['stats'][0]['datetime'],"2021-12-01T00:00:00+00:00")
+            self.assertEqual([(stat['max'],stat['sum'],stat['avg'],stat['count']) for stat in resp.json['stats']],
+                [(120,220.0,110.0,2),(110,110.0,110.0,1)])
+
+            resp = c.get("/api/users/logs/Test Exercise 4/volume?bucket=month")
+            self.assertEqual([(stat['max'],stat['sum'],stat['count']) for stat in resp.json['stats']],
+                [(1760,3860.0,3)])
+
+            resp = c.get("/api/users/logs/Test Exercise 4/distance?bucket=week")
+            self.assertEqual([(stat['max'],stat['count']) for stat in resp.json['stats']],[(1.5,1)])
+
+            resp = c.get("/api/users/logs/Test Exercise 4/weight?since=2021-12-02")
+            self.assertEqual([stat['max'] for stat in resp.json['stats']],[110])
+
+            resp = c.get("/api/users/logs/Test Exercise 4/height")
+            self.assertEqual(resp.status_code,400)
+
+            resp = c.get("/api/users/logs/Test Exercise 4/weight?bucket=year")
+            self.assertEqual(resp.status_code,400)
+
+    def test_get_exercise_analytics(self):
+        """Can a user request rolling averages, weekly volume and progression for an exercise, kept current as they log more? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            exercise4 = Exercise.query.filter_by(name="Test Exercise 4").first()
+            workout_id = workout1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            new_activities = [
+                Activity(performed_by=testuser1.id, exercise_id=exercise4.id, weight=100, reps=5, sets=3, datetime=datetime(2021,12,1,9)),
+                Activity(performed_by=testuser1.id, exercise_id=exercise4.id, weight=120, reps=5, sets=1, datetime=datetime(2021,12,1,10)),
+                Activity(performed_by=testuser1.id, exercise_id=exercise4.id, weight=110, reps=8, sets=2, datetime=datetime(2021,12,15,9)),
+                ]
+            db.session.add_all(new_activities)
+            db.session.commit()
+            db.session.add_all([Workout_Activity(workout_id=workout1.id, activity_id=activity.id) for activity in new_activities])
+            db.session.commit()
+            rebuild_exercise_stats()
+
+            resp = c.get("/api/users/analytics/Test Exercise 4?window=2")
+            self.assertEqual(resp.status_code,201)
+            analytics = resp.json['analytics']
+            self.assertEqual([(session['date'],session['top_weight'],session['estimated_1rm'],session['rolling_1rm'],session['volume'])
+                                for session in analytics['sessions']],
+                [('2021-12-01',120,140,140,2100),('2021-12-15',110,139.33,139.67,1760)])
+            self.assertEqual(analytics['weekly_volume'],[{'week': '2021-11-29', 'volume': 2100},{'week': '2021-12-13', 'volume': 1760}])
+            self.assertAlmostEqual(analytics['progression']['estimated_1rm_per_week'],-1/3)
+
+            # Served from the cache while the data is unchanged
+            self.assertRouteMaxQueries(c,"/api/users/analytics/Test Exercise 4?window=2",3)
+
+            c.post(f"/api/workouts/{workout_id}/activities",json={'exercise': 'Test Exercise 4', 'sets': 1, 'reps': 1, 'weight': 200})
+            resp = c.get("/api/users/analytics/Test Exercise 4?window=2")
+            self.assertEqual(resp.json['analytics']['progression']['sessions'],3)
+            self.assertEqual(resp.json['analytics']['sessions'][-1]['estimated_1rm'],200)
+
+            resp = c.get("/api/users/analytics/Test Exercise 5")
+            self.assertEqual(resp.json['analytics']['sessions'],[])
+            self.assertIsNone(resp.json['analytics']['progression']['estimated_1rm_per_week'])
+
+            resp = c.get("/api/users/analytics/Test Exercise 4?window=0")
+            self.assertEqual(resp.status_code,400)
+            resp = c.get("/api/users/analytics/Test Exercise 4?window=abc")
+            self.assertEqual(resp.status_code,400)
+            self.assertEqual(resp.json['response'],invalid_query_message)
+
+            resp = c.get("/api/users/analytics/Not An Exercise")
+            self.assertEqual(resp.status_code,404)
+
+    def test_get_exercises_cached(self):
+        """Are repeat requests for the exercise catalog served from cache, and refreshed when an exercise changes? """
+        with self.client as c:
+            resp = c.get("/api/exercises")
+            etag = resp.headers['ETag']
+
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual([exercise['name'] for exercise in resp.json['exercises']],
+                ["Test Exercise 1","Test Exercise 2","Test Exercise 3","Test Exercise 4","Test Exercise 5"])
+            self.assertIsNotNone(resp.last_modified)
+
+            with QueryCounter() as cached_queries:
+                resp = c.get("/api/exercises")
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual(resp.headers['ETag'],etag)
+            self.assertEqual(cached_queries.count,0)
+
+            resp = c.get("/api/exercises",headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code,304)
+
+            db.session.add(Exercise(name="Test Exercise 6",type="Cardio"))
+            db.session.commit()
+
+            resp = c.get("/api/exercises",headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code,200)
+            self.assertNotEqual(resp.headers['ETag'],etag)
+            self.assertIn("Test Exercise 6",[exercise['name'] for exercise in resp.json['exercises']])
+
+    def test_search_exercises(self):
+        """Does exercise search return ranked matches for the words typed, without querying the database once cached? """
+        with self.client as c:
+            db.session.add_all([Exercise(name="Bench Press",type="Strength"),
+                                Exercise(name="Incline Bench Press",type="Strength"),
+                                Exercise(name="Bench",type="Strength"),
+                                Exercise(name="Press-Up",type="Strength")])
+            db.session.commit()
+
+            resp = c.get("/api/exercises/search?q=bench")
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual([exercise['name'] for exercise in resp.json['exercises']],["Bench","Bench Press","Incline Bench Press"])
+
+            resp = c.get("/api/exercises/search?q=pres ben")
+            self.assertEqual([exercise['name'] for exercise in resp.json['exercises']],["Bench Press","Incline Bench Press"])
+
+            resp = c.get("/api/exercises/search?q=up")
+            self.assertEqual(resp.json['exercises'],[{'id': resp.json['exercises'][0]['id'], 'name': "Press-Up", 'type': "Strength"}])
+
+            resp = c.get("/api/exercises/search?q=test&limit=2")
+            self.assertEqual([exercise['name'] for exercise in resp.json['exercises']],["Test Exercise 1","Test Exercise 2"])
+
+            with QueryCounter() as cached_queries:
+                resp = c.get("/api/exercises/search?q=squat")
+            self.assertEqual(resp.json['exercises'],[])
+            self.assertEqual(cached_queries.count,0)
+            self.assertEqual(c.get("/api/exercises/search").json['exercises'],[])
+            self.assertEqual(c.get("/api/exercises/search?q=bench&limit=0").status_code,400)
+
+            db.session.add(Exercise(name="Back Squat",type="Strength"))
+            db.session.commit()
+            resp = c.get("/api/exercises/search?q=squat")
+            self.assertEqual([exercise['name'] for exercise in resp.json['exercises']],["Back Squat"])
+
+    def test_exercise_resolver(self):
+        """Are exercise names resolved without querying the exercises table, with 404s for unknown names? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            activity1 = Activity.query.filter_by(weight=1111111).first()
+            workout_id, activity1_id = workout1.id, activity1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+            c.get("/api/exercises")
+
+            with QueryCounter() as queries:
+                resp = c.post(f"/api/workouts/{workout_id}/activities",json={'exercise': 'Test Exercise 2', 'reps': 5})
+                c.post(f"/api/activities/{activity1_id}/update",json={'exercise': 'Test Exercise 3'})
+            self.assertEqual(resp.status_code,201)
+            self.assertFalse([statement for statement in queries.statements if statement.startswith('SELECT') and 'FROM exercises' in statement])
+            self.assertEqual(Activity.query.get(activity1_id).exercise.name,"Test Exercise 3")
+
+            resp = c.get("/api/exercises/Test Exercise 2")
+            self.assertEqual(resp.json['exercise']['name'],"Test Exercise 2")
+            self.assertEqual(c.get("/api/exercises/Not An Exercise").status_code,404)
+            self.assertEqual(c.get("/api/exercises/999999/info").status_code,404)
+            resp = c.post(f"/api/workouts/{workout_id}/activities",json={'exercise': 'Not An Exercise'})
+            self.assertEqual(resp.status_code,404)
+            resp = c.post(f"/api/activities/{activity1_id}/update",json={'exercise': 'Not An Exercise'})
+            self.assertEqual(resp.status_code,404)
+
+            # Exercises added without the session events (e.g. by another process) are still found
+            db.session.execute(Exercise.__table__.insert().values(name="Test Exercise 7",type="Strength"))
+            db.session.commit()
+            resp = c.post(f"/api/workouts/{workout_id}/activities",json={'exercise': 'Test Exercise 7'})
+            self.assertEqual(resp.status_code,201)
+
+    def test_batch_activities(self):
+        """Can a user create, update and delete a workout's activities in one request? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            activity1 = Activity.query.filter_by(weight='1111111').first()
+            activity3 = Activity.query.filter_by(weight='3333331').first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            resp = c.post(f"/api/workouts/{workout1.id}/activities/batch",json={'operations': [
+                {'op': 'create', 'exercise': 'Test Exercise 4', 'sets': '3', 'reps': 10, 'weight': ""},
+                {'op': 'create', 'exercise': 'Test Exercise 5', 'distance': '5'},
+                {'op': 'update', 'id': activity1.id, 'exercise': 'Test Exercise 2', 'weight': 5, 'reps': ""},
+                {'op': 'delete', 'id': activity3.id},
+                ]})
+
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual(len(resp.json['created']),2)
+            self.assertIsNone(Activity.query.get(activity3.id))
+            activities = {activity['id']: activity for activity in resp.json['activities']}
+            self.assertEqual(set(activities),{activity1.id} | set(resp.json['created']))
+            self.assertEqual(activities[activity1.id]['exercise'],'Test Exercise 2')
+            self.assertEqual(activities[activity1.id]['weight'],5)
+            self.assertIsNone(activities[activity1.id]['reps'])
+            self.assertEqual(activities[activity1.id]['sets'],1111113)
+            created = activities[resp.json['created'][0]]
+            self.assertEqual((created['exercise'],created['sets'],created['reps'],created['weight']),('Test Exercise 4',3,10,None))
+            self.assertEqual(activities[resp.json['created'][1]]['distance'],'5')
+
+    def test_batch_activities_all_or_nothing(self):
+        """Is an invalid batch rejected without applying any of its operations? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            activity1 = Activity.query.filter_by(weight='1111111').first()
+            activity2 = Activity.query.filter_by(weight='2222221').first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            for operations in [
+                    [{'op': 'delete', 'id': activity1.id}, {'op': 'create', 'exercise': 'Not An Exercise'}],
+                    [{'op': 'delete', 'id': activity1.id}, {'op': 'update', 'id': activity2.id, 'weight': 1}],
+                    [{'op': 'delete', 'id': activity1.id}, {'op': 'update', 'id': activity1.id, 'weight': 1}],
+                    [{'op': 'delete', 'id': activity1.id}, {'op': 'create', 'exercise': 'Test Exercise 1', 'height': 1}],
+                    [{'op': 'delete', 'id': activity1.id}, {'op': 'create', 'exercise': 'Test Exercise 1', 'reps': 'many'}],
+                    [{'op': 'rename', 'id': activity1.id}],
+                    []]:
+                resp = c.post(f"/api/workouts/{workout1.id}/activities/batch",json={'operations': operations})
+                self.assertEqual(resp.status_code,400)
+
+            resp = c.get(f"/api/workouts/{workout1.id}/activities")
+            self.assertEqual(len(resp.json['activities']),2)
+
+            testuser2 = User.query.filter_by(username="testuser2").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser2.id
+            resp = c.post(f"/api/workouts/{workout1.id}/activities/batch",json={'operations': [{'op': 'delete', 'id': activity1.id}]})
+            self.assertEqual(resp.status_code,401)
+            self.assertEqual(resp.json['response'],unauthorized_edit_message)
+
+    def test_batch_activities_query_count(self):
+        """Does a batch issue the same number of queries regardless of how many activities it creates? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+            # Load the exercise catalog, which resolves exercise names, before counting
+            c.get("/api/exercises")
+
+            with QueryCounter() as small_batch_queries:
+                c.post(f"/api/workouts/{workout1.id}/activities/batch",json={'operations': [
+                    {'op': 'create', 'exercise': 'Test Exercise 1', 'weight': 1}]})
+            with QueryCounter() as large_batch_queries:
+                resp = c.post(f"/api/workouts/{workout1.id}/activities/batch",json={'operations': [
+                    {'op': 'create', 'exercise': f'Test Exercise {n % 5 + 1}', 'weight': n} for n in range(50)]})
+            self.assertEqual(len(resp.json['activities']),53)
+            self.assertEqual(small_batch_queries.count,large_batch_queries.count)
+
+    def test_workout_cards_query_count(self):
+        """Do the workout and log pages issue the same number of queries regardless of how many workouts they show? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            exercise2 = Exercise.query.filter_by(name="Test Exercise 2").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            urls = [f"/users/{testuser1.id}/workouts", f"/users/{testuser1.id}/logs", "/workouts"]
+            small_page_queries = []
+            for url in urls:
+                with QueryCounter() as queries:
+                    resp = c.get(url)
+                self.assertIn("Test Exercise 1",resp.get_data(as_text=True))
+                small_page_queries.append(queries.count)
+
+            for n in range(10):
+                workout = Workout(creator=testuser1.id, name=f"Extra Workout {n}", is_private=False)
+                activity = Activity(performed_by=testuser1.id, exercise_id=exercise2.id, weight=n)
+                db.session.add_all([workout, activity])
+                db.session.commit()
+                db.session.add(Workout_Activity(workout_id=workout.id, activity_id=activity.id))
+                db.session.commit()
+
+            large_page_queries = []
+            for url in urls:
+                with QueryCounter() as queries:
+                    resp = c.get(url)
+                html = resp.get_data(as_text=True)
+                self.assertIn("Extra Workout 9",html)
+                self.assertIn("Test Exercise 2",html)
+                large_page_queries.append(queries.count)
+            self.assertEqual(small_page_queries,large_page_queries)
+
+    def test_public_feed_paginated_and_cached(self):
+        """Is the shared workout feed paginated, with a cached first page that changes when a workout is shared, unshared or deleted? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            user_id, workout_id = testuser1.id, workout1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = user_id
+            db.session.add_all([Workout(creator=user_id, name=f"Feed Workout {n}", is_private=False,
+                                datetime=datetime(2020,1,1+n)) for n in range(30)])
+            db.session.commit()
+
+            html = c.get("/workouts").get_data(as_text=True)
+            self.assertIn("Test Workout 1",html)
+            self.assertNotIn("Feed Workout 7<",html)
+            next_page = html.split('href="?after=')[1].split('"')[0]
+            resp = c.get(f"/workouts?after={next_page}")
+            self.assertIn("Feed Workout 7<",resp.get_data(as_text=True))
+            self.assertNotIn("Load More",resp.get_data(as_text=True))
+            self.assertEqual(c.get("/workouts?after=nonsense").status_code,400)
+
+            # Only the logged in user is loaded while the page is cached
+            self.assertRouteMaxQueries(c,"/workouts",1)
+
+            c.get(f"/api/workouts/{workout_id}/share")
+            self.assertNotIn("Test Workout 1",c.get("/workouts").get_data(as_text=True))
+            c.get(f"/api/workouts/{workout_id}/share")
+            self.assertIn("Test Workout 1",c.get("/workouts").get_data(as_text=True))
+            c.get(f"/workouts/{workout_id}/delete")
+            self.assertNotIn("Test Workout 1",c.get("/workouts").get_data(as_text=True))
+
+    def test_authenticated_request_without_user_query(self):
+        """Does an authenticated API request avoid loading the user's row? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            c.get("/api/exercises")
+            with QueryCounter() as queries:
+                resp = c.get("/api/exercises")
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual(queries.count,0)
+
+    def test_route_query_budgets(self):
+        """Do the read routes stay within their SQL statement budgets? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            user_id, workout_id = testuser1.id, workout1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = user_id
+
+            budgets = {
+                "/workouts": 3,
+                f"/users/{user_id}/workouts": 4,
+                f"/users/{user_id}/logs": 4,
+                f"/workouts/{workout_id}": 2,
+                f"/workouts/{workout_id}/edit": 2,
+                f"/api/workouts/{workout_id}/activities": 2,
+                "/api/exercises": 1,
+                "/api/users/logs/Test Exercise 1": 2,
+                "/api/users/logs/Test Exercise 1/weight?bucket=week": 2,
+            }
+            for url, limit in budgets.items():
+                resp = self.assertRouteMaxQueries(c, url, limit)
+                self.assertLess(resp.status_code,300)
+
+    def test_server_timing_header(self):
+        """Does every response report its SQL statement count and database time, and are expensive requests logged? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            workout_id = workout1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            resp = c.get(f"/api/workouts/{workout_id}/activities")
+            self.assertRegex(resp.headers['Server-Timing'],r'^db;dur=\d+\.\d\d;desc="2 queries", app;dur=\d+\.\d\d$')
+
+            threshold = app.config['SQL_LOG_THRESHOLD_QUERIES']
+            app.config['SQL_LOG_THRESHOLD_QUERIES'] = 2
+            try:
+                with self.assertLogs(app.logger, 'WARNING') as logs:
+                    c.get(f"/api/workouts/{workout_id}/activities")
+            finally:
+                app.config['SQL_LOG_THRESHOLD_QUERIES'] = threshold
+            self.assertIn(f"GET /api/workouts/{workout_id}/activities: 2 queries",logs.output[0])
+
+    def test_metrics(self):
+        """Are request, pool and cache metrics exposed in the Prometheus text format? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            workout_id = workout1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+
+            requests_before = REGISTRY.get_sample_value('http_requests_total',
+                        {'endpoint': 'get_workout', 'method': 'GET', 'status': '200'}) or 0
+            catalog_hits_before = REGISTRY.get_sample_value('cache_requests_total',
+                        {'cache': 'exercise_catalog', 'result': 'hit'}) or 0
+            c.get(f"/api/workouts/{workout_id}/activities")
+            c.get("/api/exercises")
+            c.get("/api/exercises")
+
+            resp = c.get("/metrics")
+            body = resp.get_data(as_text=True)
+            self.assertEqual(resp.status_code,200)
+            self.assertTrue(resp.content_type.startswith('text/plain'))
+            self.assertIn('http_request_duration_seconds_bucket{endpoint="get_workout",le="0.005",method="GET"}',body)
+            self.assertIn('db_pool_checked_out ',body)
+            self.assertEqual(REGISTRY.get_sample_value('http_requests_total',
+                        {'endpoint': 'get_workout', 'method': 'GET', 'status': '200'}),requests_before + 1)
+            self.assertGreater(REGISTRY.get_sample_value('cache_requests_total',
+                        {'cache': 'exercise_catalog', 'result': 'hit'}),catalog_hits_before)
+
+    def assertSummariesCurrent(self):
+        """Checks every stored exercise summary matches one computed from scratch"""
+        db.session.expire_all()
+        stored = {tuple(row)[:-1] for row in db.session.execute(db.select([User_Exercise_Stats.__table__]))}
+        computed = {tuple(row)[:-1] for row in db.session.execute(summary_select())}
+        self.assertEqual(stored,computed)
+
+    def test_concurrent_summary_refreshes(self):
+        """Do two transactions refreshing the same exercise summary at once both succeed? """
+        testuser1 = User.query.filter_by(username="testuser1").first()
+        exercise1 = Exercise.query.filter_by(name="Test Exercise 1").first()
+        pairs = {(testuser1.id, exercise1.id)}
+        rebuild_exercise_stats()
+        db.session.remove()
+        first_refreshed, first_may_commit = threading.Event(), threading.Event()
+        errors = []
+
+        def refresh(refreshed=None, may_commit=None):
+            with app.app_context():
+                try:
+                    refresh_exercise_stats(pairs)
+                    if refreshed:
+                        refreshed.set()
+                        may_commit.wait(5)
+                    db.session.commit()
+                except Exception as error:
+                    errors.append(error)
+                    if refreshed:
+                        refreshed.set()
+                finally:
+                    db.session.remove()
+
+        first = threading.Thread(target=refresh, args=(first_refreshed, first_may_commit))
+        first.start()
+        first_refreshed.wait(5)
+        # The second refresh blocks on the first's uncommitted summary until it commits
+        second = threading.Thread(target=refresh)
+        second.start()
+        second.join(0.5)
+        first_may_commit.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(errors,[])
+        self.assertSummariesCurrent()
+
+    def test_exercise_summary_maintained(self):
+        """Is a user's exercise summary kept current as activities and logged workouts change? """
+        with self.client as c:
+            testuser1 = User.query.filter_by(username="testuser1").first()
+            workout1 = Workout.query.filter_by(name="Test Workout 1").first()
+            activity1 = Activity.query.filter_by(weight=1111111).first()
+            workout_id, activity1_id = workout1.id, activity1.id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1.id
+            self.assertEqual(rebuild_exercise_stats(),4)
+
+            resp = c.get("/api/users/summary/Test Exercise 1")
+            self.assertEqual(resp.json['summary']['session_count'],1)
+            self.assertEqual(resp.json['summary']['best_weight'],1111111)
+
+            resp = c.post(f"/api/workouts/{workout_id}/activities",json={'exercise': 'Test Exercise 1', 'sets': 2, 'reps': 3, 'weight': 5})
+            new_activity_id = resp.json['activity']['id']
+            self.assertSummariesCurrent()
+            resp = c.get("/api/users/summary/Test Exercise 1")
+            self.assertEqual(resp.json['summary']['activity_count'],2)
+
+            c.get(f"/api/activities/{activity1_id}/delete")
+            self.assertSummariesCurrent()
+            resp = c.get("/api/users/summary/Test Exercise 1")
+            self.assertEqual(resp.json['summary']['best_weight'],5)
+            self.assertEqual(resp.json['summary']['total_volume'],30)
+
+            c.post(f"/api/activities/{new_activity_id}/update",json={'weight': 7})
+            self.assertSummariesCurrent()
+            c.post(f"/api/workouts/{workout_id}/activities/batch",json={'operations': [
+                {'op': 'create', 'exercise': 'Test Exercise 1', 'weight': 9},
+                {'op': 'update', 'id': new_activity_id, 'exercise': 'Test Exercise 2'}]})
+            self.assertSummariesCurrent()
+            resp = c.get("/api/users/summary/Test Exercise 1")
+            self.assertEqual(resp.json['summary']['best_weight'],9)
+            self.assertEqual(resp.json['summary']['activity_count'],1)
+
+            c.get(f"/api/workouts/{workout_id}/log")
+            self.assertSummariesCurrent()
+            resp = c.get("/api/users/summary/Test Exercise 1")
+            self.assertIsNone(resp.json['summary'])
+
+            c.get(f"/api/workouts/{workout_id}/log")
+            c.get(f"/workouts/{workout_id}/clone")
+            self.assertSummariesCurrent()
+            resp = c.get("/api/users/summary/Test Exercise 1")
+            self.assertEqual(resp.json['summary']['session_count'],2)
+
+            c.get(f"/workouts/{workout_id}/delete")
+            self.assertSummariesCurrent()
+            resp = self.assertRouteMaxQueries(c, "/api/users/summary/Test Exercise 1", 2)
+            self.assertEqual(resp.json['summary']['session_count'],1)
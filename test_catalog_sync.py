@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from urllib.parse import urlparse, parse_qs
+
+from models import db, User, Exercise, Activity, Workout, Workout_Activity, Catalog_Sync_Page
+
+# Declare test database
+os.environ['DATABASE_URL'] = "postgresql:///workoutcompanion-test"
+
+# Import application
+from app import app
+from catalog import exercise_catalog
+from catalog_sync import sync_exercises, diff_exercises
+
+# Helper function for clearing database models
+def delete_all_from_model(model_name):
+    results = model_name.query.all()
+    for result in results:
+        db.session.delete(result)
+    db.session.commit()
+
+# Create test database tables
+db.create_all()
+
+class StubWgerHandler(BaseHTTPRequestHandler):
+    """Answers /exercise/?limit=&offset= like the wger API, with ETags, counting full and not modified responses"""
+    exercises = []
+    full = 0
+    not_modified = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        limit, offset = int(params['limit'][0]), int(params['offset'][0])
+        results = StubWgerHandler.exercises[offset:offset + limit]
+        next_url = None
+        if offset + limit < len(StubWgerHandler.exercises):
+            next_url = f"http://{self.headers['Host']}{url.path}?limit={limit}&offset={offset + limit}&language=2"
+        body = json.dumps({'count': len(StubWgerHandler.exercises), 'next': next_url, 'results': results}).encode('utf-8')
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            StubWgerHandler.not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        StubWgerHandler.full += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class CatalogSyncTestCase(TestCase):
+    """Test the incremental exercise catalog sync."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubWgerHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Empty the catalog and give the stub server an exercise list"""
+        for model in [User, Exercise, Activity, Workout, Workout_Activity, Catalog_Sync_Page]:
+            delete_all_from_model(model)
+        StubWgerHandler.exercises = [
+            {'id': 192, 'name': "Bench Press", 'category': 11},
+            {'id': 111, 'name': "Squats", 'category': 9},
+            {'id': 300, 'name': "Running", 'category': 15},
+            {'id': 307, 'name': "Bear Walk", 'category': 9},
+            {'id': 718, 'name': "Bear Walk", 'category': 9},
+        ]
+        StubWgerHandler.full = 0
+        StubWgerHandler.not_modified = 0
+
+    def tearDown(self):
+        """Tear down"""
+        db.session.rollback()
+
+    def sync(self):
+        with app.app_context():
+            return sync_exercises(self.base_url, page_size=2)
+
+    def test_sync_adds_exercises(self):
+        """Does a first sync page through the upstream list and add every exercise, skipping duplicate names? """
+        result = self.sync()
+
+        self.assertEqual(result['pages fetched'],3)
+        self.assertEqual(result['added'],4)
+        self.assertEqual(result['aliases'],{718: 307})
+        self.assertEqual({exercise.id: (exercise.name, exercise.type) for exercise in Exercise.query},
+            {192: ("Bench Press", "Strength"), 111: ("Squats", "Strength"), 300: ("Running", "Cardio"), 307: ("Bear Walk", "Cardio")})
+        self.assertEqual(exercise_catalog.find("Running")['id'],300)
+
+        # Exercises created locally get ids past the synced ones
+        db.session.add(Exercise(name="Local Exercise", type="Strength"))
+        db.session.commit()
+
+    def test_sync_is_incremental(self):
+        """Are unchanged pages skipped with conditional requests, and upstream renames applied? """
+        self.sync()
+
+        result = self.sync()
+        self.assertEqual((result['pages fetched'],result['pages unchanged'],result['added'],result['renamed']),(0,3,0,0))
+        self.assertEqual(StubWgerHandler.not_modified,3)
+
+        StubWgerHandler.exercises[2] = {'id': 300, 'name': "Treadmill Running", 'category': 15}
+        StubWgerHandler.exercises[4] = {'id': 400, 'name': "Deadlift", 'category': 12}
+        result = self.sync()
+        self.assertEqual((result['pages fetched'],result['pages unchanged'],result['added'],result['renamed']),(2,1,1,1))
+        self.assertEqual(Exercise.query.get(300).name,"Treadmill Running")
+        self.assertEqual(Exercise.query.get(400).name,"Deadlift")
+
+        result = self.sync()
+        self.assertEqual(result['pages fetched'],0)
+
+    def test_diff_exercises(self):
+        """Is a name freed by a rename given to the exercise wanting it, and are blank and duplicate names skipped? """
+        rows, aliases = diff_exercises(
+            [{'id': 1, 'name': "Curl"}, {'id': 2, 'name': "Hammer Curl"}, {'id': 3, 'name': "Curl"}, {'id': 4, 'name': " "}],
+            {1: "Biceps Curl", 2: "Curl"})
+        self.assertEqual([(row['id'], row['name']) for row in rows],[(1,"Curl"),(2,"Hammer Curl")])
+        self.assertEqual(aliases,{3: 1})
+
+        # A chain and a swap of names are renames, not aliases
+        rows, aliases = diff_exercises([{'id': 1, 'name': "B"}, {'id': 2, 'name': "C"}], {1: "A", 2: "B"})
+        self.assertEqual([(row['id'], row['name']) for row in rows],[(1,"B"),(2,"C")])
+        self.assertEqual(aliases,{})
+        rows, aliases = diff_exercises([{'id': 1, 'name': "B"}, {'id': 2, 'name': "A"}], {1: "A", 2: "B"})
+        self.assertEqual([(row['id'], row['name']) for row in rows],[(1,"B"),(2,"A")])
+        self.assertEqual(aliases,{})
+
+        # An exercise on an unchanged page keeps its name; one that can't take it keeps its own, blocking another
+        rows, aliases = diff_exercises([{'id': 1, 'name': "C"}, {'id': 2, 'name': "A"}], {1: "A", 2: "B", 3: "C"})
+        self.assertEqual(rows,[])
+        self.assertEqual(aliases,{1: 3, 2: 1})
+
+    def test_sync_swaps_names(self):
+        """Are upstream name swaps and chains applied, without clashing on the unique name? """
+        self.sync()
+        StubWgerHandler.exercises[0] = {'id': 192, 'name': "Squats", 'category': 11}
+        StubWgerHandler.exercises[1] = {'id': 111, 'name': "Running", 'category': 9}
+        StubWgerHandler.exercises[2] = {'id': 300, 'name': "Bench Press", 'category': 15}
+        result = self.sync()
+        self.assertEqual((result['pages fetched'],result['renamed'],result['aliases']),(2,3,{}))
+        self.assertEqual({exercise.id: exercise.name for exercise in Exercise.query},
+            {192: "Squats", 111: "Running", 300: "Bench Press", 307: "Bear Walk"})
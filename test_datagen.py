@@ -0,0 +1,71 @@
+import os
+from datetime import datetime
+from unittest import TestCase
+
+from models import db, User, Exercise, Activity, Workout, Workout_Activity, User_Exercise_Stats
+
+# Declare test database
+os.environ['DATABASE_URL'] = "postgresql:///workoutcompanion-test"
+
+# Import application
+from app import app
+from datagen import generate, reset_tables
+from exerciseList import idLookup
+
+# Create test database tables
+db.create_all()
+
+NOW = datetime(2021, 12, 1, 12, 0, 0)
+
+def dataset():
+    """Returns every generated row except password hashes, which are salted"""
+    return [
+        db.session.query(User.id, User.username, User.email).order_by(User.id).all(),
+        db.session.query(Exercise.id, Exercise.name, Exercise.type).order_by(Exercise.id).all(),
+        db.session.query(Workout.id, Workout.creator, Workout.name, Workout.datetime, Workout.is_private, Workout.is_logged).order_by(Workout.id).all(),
+        db.session.query(*Activity.__table__.columns).order_by(Activity.id).all(),
+        db.session.query(Workout_Activity.workout_id, Workout_Activity.activity_id).order_by(Workout_Activity.activity_id).all(),
+    ]
+
+class DatagenTestCase(TestCase):
+    """Test the synthetic data generator."""
+
+    def setUp(self):
+        reset_tables()
+
+    def tearDown(self):
+        db.session.rollback()
+        reset_tables()
+
+    def generate(self, exercises=len(idLookup), seed=3):
+        with app.app_context():
+            counts = generate(users=3, exercises=exercises, workouts_per_user=4, activities_per_workout=3, seed=seed, now=NOW)
+            return counts, dataset()
+
+    def test_row_counts(self):
+        """Are the reported row counts the rows loaded, with only the real wger exercises by default? """
+        counts, (users, exercises, workouts, activities, links) = self.generate()
+
+        self.assertEqual(counts['users'],len(users))
+        self.assertEqual(counts['users'],3)
+        self.assertEqual(counts['workouts'],len(workouts))
+        self.assertEqual(counts['activities'],len(activities))
+        self.assertEqual(len(links),len(activities))
+        self.assertEqual({(name, exercise_id) for exercise_id, name, kind in exercises},set(idLookup.items()))
+        self.assertEqual(counts['exercise summaries'],User_Exercise_Stats.query.count())
+
+        reset_tables()
+        counts, (users, exercises, workouts, activities, links) = self.generate(exercises=len(idLookup) + 2)
+        self.assertEqual(len(exercises),len(idLookup) + 2)
+        self.assertEqual(sum(name.startswith("Synthetic Exercise") for exercise_id, name, kind in exercises),2)
+
+    def test_same_seed_same_data(self):
+        """Does the same seed generate identical data, and another seed different data? """
+        counts, first = self.generate()
+        reset_tables()
+        counts, second = self.generate()
+        reset_tables()
+        counts, other = self.generate(seed=4)
+
+        self.assertEqual(first,second)
+        self.assertNotEqual(first[2:],other[2:])
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+from models import db, connect_db, User, Exercise, Exercise_Info, Activity, Workout, Workout_Activity
+from messages import *
+
+# Declare test database
+os.environ['DATABASE_URL'] = "postgresql:///workoutcompanion-test"
+
+# Import application
+from app import app, USER_KEY
+
+# Helper function for clearing database models
+def delete_all_from_model(model_name):
+    results = model_name.query.all()
+    for result in results:
+        db.session.delete(result)
+    db.session.commit()
+
+# Create test database tables
+db.create_all()
+
+class StubWgerHandler(BaseHTTPRequestHandler):
+    """Answers /exerciseinfo/<id>/ like the wger API, counting requests"""
+    hits = 0
+    failing = False
+
+    def do_GET(self):
+        StubWgerHandler.hits += 1
+        if StubWgerHandler.failing:
+            self.send_response(500)
+            self.end_headers()
+            return
+        exercise_id = int(self.path.strip('/').split('/')[-1])
+        body = json.dumps({'id': exercise_id,
+                    'description': f"<p>Description {StubWgerHandler.hits}</p>",
+                    'muscles': [{'name': 'Biceps'}],
+                    'equipment': [{'name': 'Barbell'}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class ExerciseInfoTestCase(TestCase):
+    """Test the cached exercise info API."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubWgerHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        app.config['WGER_API_URL'] = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Create test client, add sample data."""
+
+        self.client = app.test_client()
+        StubWgerHandler.hits = 0
+        StubWgerHandler.failing = False
+
+        #Delete all from database
+        for model in [User, Exercise, Exercise_Info, Activity, Workout, Workout_Activity]:
+            delete_all_from_model(model)
+
+        exercise_1 = Exercise(id=192, name="Test Exercise 1", type="Strength")
+        db.session.add(exercise_1)
+        db.session.commit()
+
+    def tearDown(self):
+        """Tear down"""
+        db.session.rollback()
+
+    def test_fetch_and_cache_info(self):
+        """Is exercise info fetched once and then served from the cache? """
+        with self.client as c:
+            resp = c.get("/api/exercises/192/info")
+
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual(resp.json['description'],"<p>Description 1</p>")
+            self.assertEqual(resp.json['muscles'],[{'name': 'Biceps'}])
+            self.assertEqual(StubWgerHandler.hits,1)
+
+            resp = c.get("/api/exercises/192/info")
+
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual(resp.json['description'],"<p>Description 1</p>")
+            self.assertEqual(StubWgerHandler.hits,1)
+
+    def test_stale_info_revalidated(self):
+        """Is stale exercise info served immediately and refreshed in the background? """
+        with self.client as c:
+            c.get("/api/exercises/192/info")
+            cached = Exercise_Info.query.get(192)
+            cached.fetched_at = datetime.utcnow() - timedelta(seconds=app.config['EXERCISE_INFO_TTL'] + 60)
+            db.session.commit()
+
+            resp = c.get("/api/exercises/192/info")
+            self.assertEqual(resp.json['description'],"<p>Description 1</p>")
+
+            deadline = time.time() + 5
+            while Exercise_Info.query.get(192).details['description'] != "<p>Description 2</p>" and time.time() < deadline:
+                db.session.rollback()
+                time.sleep(0.05)
+            self.assertEqual(StubWgerHandler.hits,2)
+
+            resp = c.get("/api/exercises/192/info")
+            self.assertEqual(resp.json['description'],"<p>Description 2</p>")
+
+    def test_expired_info_refetched(self):
+        """Is exercise info past the stale window fetched again before responding, falling back to the old copy on failure? """
+        with self.client as c:
+            c.get("/api/exercises/192/info")
+            cached = Exercise_Info.query.get(192)
+            cached.fetched_at = datetime.utcnow() - timedelta(seconds=app.config['EXERCISE_INFO_STALE_TTL'] + 60)
+            db.session.commit()
+
+            StubWgerHandler.failing = True
+            resp = c.get("/api/exercises/192/info")
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual(resp.json['description'],"<p>Description 1</p>")
+
+            StubWgerHandler.failing = False
+            resp = c.get("/api/exercises/192/info")
+            self.assertEqual(resp.json['description'],"<p>Description 3</p>")
+
+    def test_info_unavailable(self):
+        """Does the API report upstream failures and unknown exercises? """
+        with self.client as c:
+            StubWgerHandler.failing = True
+            resp = c.get("/api/exercises/192/info")
+
+            self.assertEqual(resp.status_code,502)
+            self.assertEqual(resp.json['response'],exercise_info_unavailable_message)
+
+            resp = c.get("/api/exercises/999/info")
+            self.assertEqual(resp.status_code,404)
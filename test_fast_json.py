@@ -0,0 +1,63 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+from unittest import TestCase
+
+from flask import json
+
+from models import db
+
+# Declare test database
+os.environ['DATABASE_URL'] = "postgresql:///workoutcompanion-test"
+
+# Import application
+from app import app
+from fast_json import dumps, jsonify, records
+from messages import unauthorized_access_message
+
+class FastJsonTestCase(TestCase):
+    """Test JSON encoding with orjson."""
+
+    def test_datetimes_are_utc_iso_8601(self):
+        """Are naive datetimes from the database encoded as ISO 8601 in UTC? """
+        self.assertEqual(dumps({'datetime': datetime(2021,12,1,9,30)}),b'{"datetime":"2021-12-01T09:30:00+00:00"}')
+
+    def test_decimals_and_non_str_keys(self):
+        """Are Decimals (from numeric columns and aggregates) encoded as numbers, and int keys as strings? """
+        self.assertEqual(dumps({1: Decimal('2.5'), 'total': Decimal('10')}),b'{"1":2.5,"total":10.0}')
+
+    def test_unsupported_type(self):
+        """Is a value orjson cannot encode rejected with TypeError, as the standard encoder does? """
+        with self.assertRaises(TypeError):
+            dumps({'value': object()})
+
+    def test_records_from_rows(self):
+        """Does records() turn result rows into dicts keyed by column label, and do rows encode the same way? """
+        with app.app_context():
+            rows = db.session.execute(db.text("SELECT 1 AS id, 'Squats' AS exercise, CAST('2021-12-01 09:00' AS timestamp) AS datetime "
+                                                "UNION ALL SELECT 2, 'Lunges', NULL")).all()
+        self.assertEqual(records(rows),[
+            {'id': 1, 'exercise': 'Squats', 'datetime': datetime(2021,12,1,9)},
+            {'id': 2, 'exercise': 'Lunges', 'datetime': None}])
+        self.assertEqual(records([]),[])
+        self.assertEqual(dumps(rows),dumps(records(rows)))
+
+    def test_jsonify(self):
+        """Does jsonify build a JSON response like flask.jsonify, from keyword arguments or one value? """
+        with app.test_request_context():
+            resp = jsonify(stats=[{'weight': 100}], next=None)
+            self.assertEqual(resp.status_code,200)
+            self.assertEqual(resp.headers['Content-Type'],'application/json')
+            self.assertEqual(resp.get_data(),b'{"stats":[{"weight":100}],"next":null}\n')
+            self.assertEqual(jsonify([1, 2]).get_data(),b'[1,2]\n')
+            with self.assertRaises(TypeError):
+                jsonify([1], next=None)
+
+    def test_dict_responses(self):
+        """Are dicts returned by views, such as error responses, and flask.json encoded with orjson too? """
+        resp = app.test_client().get("/api/users/summary/Test Exercise 1")
+        self.assertEqual(resp.status_code,401)
+        self.assertEqual(resp.headers['Content-Type'],'application/json')
+        self.assertEqual(resp.json,{'response': unauthorized_access_message})
+        with app.app_context():
+            self.assertEqual(json.dumps({'datetime': datetime(2021,12,1)}),'{"datetime":"2021-12-01T00:00:00+00:00"}')
@@ -0,0 +1,65 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from unittest import TestCase
+
+import runtime_config
+
+BOOT_TIMEOUT_SECONDS = 30
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class GunicornConfigTestCase(TestCase):
+    """Test booting gunicorn with gunicorn.conf.py."""
+
+    def test_boots_with_empty_tmpdir(self):
+        """Does the default (preloading) profile start on a host with no metrics directory yet, and serve /metrics? """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            port = free_port()
+            env = dict(os.environ, TMPDIR=tmpdir, DATABASE_URL="postgresql:///workoutcompanion-test", WEB_CONCURRENCY='1')
+            env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+            server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f"127.0.0.1:{port}", 'app:app'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            try:
+                deadline = time.monotonic() + BOOT_TIMEOUT_SECONDS
+                while True:
+                    if server.poll() is not None:
+                        self.fail(f"gunicorn exited during boot:\n{server.stderr.read().decode()}")
+                    try:
+                        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+                            self.assertEqual(resp.status,200)
+                            self.assertIn(b'db_pool_checked_out',resp.read())
+                        break
+                    except OSError:
+                        self.assertLess(time.monotonic(),deadline)
+                        time.sleep(0.2)
+                self.assertTrue(os.listdir(os.path.join(tmpdir, 'workoutpartner-metrics')))
+            finally:
+                server.terminate()
+                server.wait(timeout=BOOT_TIMEOUT_SECONDS)
+
+    def test_statement_timeout_only_when_serving(self):
+        """Is the statement timeout set for web workers, but not for migrations and flask commands? """
+        self.assertNotIn('connect_args',runtime_config.engine_options({}, web=False))
+        self.assertEqual(runtime_config.engine_options({'DATABASE_STATEMENT_TIMEOUT_MS': '5000'}, web=True)['connect_args'],
+                         {'options': "-c statement_timeout=5000"})
+
+        check = "from app import app; print(app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('connect_args'))"
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = dict(os.environ, TMPDIR=tmpdir, DATABASE_URL="postgresql:///workoutcompanion-test")
+            env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+            as_command = subprocess.run([sys.executable, '-c', check], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+            # Loading the gunicorn config first, as the server does
+            as_server = subprocess.run([sys.executable, '-c', f"exec(open('gunicorn.conf.py').read()); {check}"], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(as_command.stdout.strip(),"None")
+        self.assertIn("statement_timeout",as_server.stdout)
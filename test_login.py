@@ -1,4 +1,7 @@
 import os
+import subprocess
+import sys
+import threading
 from unittest import TestCase
 
 from models import db, connect_db, User, Exercise, Activity, Workout, Workout_Activity
@@ -9,7 +12,9 @@ from messages import *
 os.environ['DATABASE_URL'] = "postgresql:///workoutcompanion-test"
 
 # Import application
-from app import app, USER_KEY
+from app import app, USER_KEY, USERNAME_KEY, Principal, StaleSession
+from passwords import password_hasher, hash_cost
+import runtime_config
 
 # Helper function for clearing database models
 def delete_all_from_model(model_name):
@@ -86,6 +91,8 @@ class LoginViewTestCase(TestCase):
 
             self.assertEqual(resp.status_code, 200)
             self.assertIn("Logout",html)
+            with c.session_transaction() as sess:
+                self.assertEqual(sess[USERNAME_KEY],"testuser1")
     
     def test_redundant_login(self):
         """Is a user who is already logged in notified if they try to login again """
@@ -238,6 +245,9 @@ class LoginViewTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn(successful_logout_message,html)
             self.assertIn("Login",html)
+            with c.session_transaction() as sess:
+                self.assertNotIn(USER_KEY,sess)
+                self.assertNotIn(USERNAME_KEY,sess)
 
     def test_redundant_logout(self):
         """Is user notified if already logged out? """
@@ -249,3 +259,124 @@ class LoginViewTestCase(TestCase):
             self.assertIn(redundant_logout_message,html)
             self.assertIn("Login",html)
 
+    def test_deleted_user_session(self):
+        """Is a session whose user was deleted logged out, rather than failing, when the user is needed? """
+        deleted_user = User.signup(username="deleteduser",email="deleted@test.com",password="testpassword3")
+        db.session.add(deleted_user)
+        db.session.commit()
+        deleted_user_id = deleted_user.id
+        db.session.delete(deleted_user)
+        db.session.commit()
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = deleted_user_id
+            resp = c.get("/workouts/new",follow_redirects=True)
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn(unauthorized_access_message,html)
+            self.assertIn("Login",html)
+            with c.session_transaction() as sess:
+                self.assertNotIn(USER_KEY,sess)
+            self.assertEqual(Workout.query.count(),0)
+
+        with self.assertRaises(StaleSession):
+            Principal(deleted_user_id).email
+
+
+    def test_login_rehashes_password(self):
+        """Is a password hashed with an old work factor rehashed with the configured one on login? """
+        try:
+            password_hasher.configure(rounds=5)
+            with self.client as c:
+                resp = c.post("/login", data={
+                    "username":"testuser1",
+                    "password":"testpassword1"
+                })
+
+                self.assertEqual(resp.status_code, 302)
+                self.assertEqual(hash_cost(User.query.filter_by(username="testuser1").first().password),5)
+                self.assertEqual(hash_cost(User.query.filter_by(username="testuser2").first().password),app.config['BCRYPT_LOG_ROUNDS'])
+        finally:
+            password_hasher.init_app(app)
+
+    def test_reconfigure_hasher_stops_old_pool(self):
+        """Does reconfiguring the password hasher shut down the old pool's threads, rather than leaking them? """
+        try:
+            password_hasher.hash("password")
+            old_executor = password_hasher._executor
+            old_threads = [thread for thread in threading.enumerate() if thread.name.startswith('password-hash')]
+            password_hasher.configure(rounds=5)
+            for thread in old_threads:
+                thread.join(5)
+                self.assertFalse(thread.is_alive())
+            with self.assertRaises(RuntimeError):
+                old_executor.submit(print)
+            self.assertTrue(password_hasher.verify(password_hasher.hash("password"),"password"))
+        finally:
+            password_hasher.init_app(app)
+
+    def test_hash_limits_leave_threads_free(self):
+        """Do the default hashing limits leave request threads free for other routes, for every worker class? """
+        for env, expected in [({}, {'workers': 2, 'queue_depth': 0}),
+                              ({'GUNICORN_THREADS': '8'}, {'workers': 2, 'queue_depth': 2}),
+                              ({'GUNICORN_WORKER_CLASS': 'gevent'}, {'workers': 2, 'queue_depth': 8}),
+                              ({'GUNICORN_WORKER_CLASS': 'sync'}, {'workers': 1, 'queue_depth': 0})]:
+            limits = runtime_config.password_hash_limits(env)
+            self.assertEqual(limits,expected)
+            concurrency = runtime_config.worker_concurrency(runtime_config.worker_settings(env))
+            self.assertLessEqual(limits['workers'] + limits['queue_depth'],max(1, concurrency // 2))
+        self.assertEqual(runtime_config.password_hash_limits({'PASSWORD_HASH_WORKERS': '3', 'PASSWORD_HASH_QUEUE_DEPTH': '1'}),
+                         {'workers': 3, 'queue_depth': 1})
+
+    def test_hashing_under_gevent(self):
+        """With threading monkey-patched, does hashing run on native threads, leaving other greenlets running? """
+        check = ("from gevent import monkey; monkey.patch_all()\n"
+                 "import gevent, passwords\n"
+                 "passwords.password_hasher.configure(rounds=12)\n"
+                 "ticks = []\n"
+                 "def tick():\n"
+                 "    while True:\n"
+                 "        ticks.append(1)\n"
+                 "        gevent.sleep(0.01)\n"
+                 "ticker = gevent.spawn(tick)\n"
+                 "gevent.sleep(0)\n"
+                 "passwords.password_hasher.hash('password')\n"
+                 "print(passwords.pool_class().__module__, len(ticks) > 2)")
+        result = subprocess.run([sys.executable, '-c', check], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.split(),['gevent.threadpool', 'True'])
+
+    def test_login_busy(self):
+        """Are logins shed with a 503 while the hashing pool and its queue are full? """
+        started, release = threading.Event(), threading.Event()
+        def hold_slot():
+            started.set()
+            release.wait(5)
+        try:
+            password_hasher.configure(rounds=app.config['BCRYPT_LOG_ROUNDS'], workers=1, queue_depth=0)
+            holder = threading.Thread(target=password_hasher._run, args=(hold_slot,))
+            holder.start()
+            started.wait(5)
+            with self.client as c:
+                resp = c.post("/login", data={
+                    "username":"testuser1",
+                    "password":"testpassword1"
+                })
+                html = resp.get_data(as_text=True)
+
+                self.assertEqual(resp.status_code, 503)
+                self.assertEqual(resp.headers['Retry-After'], '1')
+                self.assertIn(login_busy_message,html)
+
+                release.set()
+                holder.join()
+                resp = c.post("/login", data={
+                    "username":"testuser1",
+                    "password":"testpassword1"
+                })
+                self.assertEqual(resp.status_code, 302)
+        finally:
+            release.set()
+            password_hasher.init_app(app)
@@ -2,14 +2,14 @@ import os
 from unittest import TestCase
 
 from models import db, connect_db, User, Exercise, Activity, Workout, Workout_Activity
-from datetime import datetime
+from datetime import datetime, timedelta
 from messages import *
 
 # Declare test database
 os.environ['DATABASE_URL'] = "postgresql:///workoutcompanion-test"
 
 # Import application
-from app import app, USER_KEY
+from app import app, USER_KEY, WORKOUTS_PAGE_SIZE
 
 # Helper function for clearing database models
 def delete_all_from_model(model_name):
@@ -197,3 +197,94 @@ class WorkoutViewTestCase(TestCase):
             self.assertNotIn("3333333",html)
             self.assertNotIn("Duration",html)
             self.assertNotIn("3333334",html)
+
+    def test_new_workout(self):
+        """ Does a logged in user get a new private workout to edit? """
+        with self.client as c:
+            testuser1_id = User.query.filter_by(username="testuser1").first().id
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1_id
+
+            resp = c.get("/workouts/new")
+            new_workout = Workout.query.filter_by(creator=testuser1_id).order_by(Workout.id.desc()).first()
+
+            self.assertEqual(resp.status_code, 302)
+            self.assertIn(f"/workouts/{new_workout.id}/edit",resp.location)
+            self.assertTrue(new_workout.is_private)
+            # Stamped when it is created, so it sorts first among the user's workouts
+            self.assertLess(abs(datetime.utcnow() - new_workout.datetime),timedelta(minutes=1))
+
+    def test_clone_workout(self):
+        """ Can a logged in user copy another user's workout, with its activities? """
+        with self.client as c:
+            testuser2 = User.query.filter_by(username="testuser2").first()
+            testworkout1 = Workout.query.filter_by(name="Test Workout 1").first()
+
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser2.id
+
+            resp = c.get(f"/workouts/{testworkout1.id}/clone")
+            cloned_workout = Workout.query.filter_by(name="Test Workout 1", creator=testuser2.id).first()
+
+            self.assertEqual(resp.status_code, 302)
+            self.assertIsNotNone(cloned_workout)
+            self.assertIn(f"/workouts/{cloned_workout.id}/edit",resp.location)
+            self.assertTrue(cloned_workout.is_private)
+            self.assertEqual(Workout.load_cards([cloned_workout])[cloned_workout.id]['exercises'],["Test Exercise 1"])
+
+            testworkout1 = Workout.query.filter_by(name="Test Workout 1", creator=testworkout1.creator).first()
+            cloned_activity = cloned_workout.workout_activities.first()
+            original_activity = testworkout1.workout_activities.first()
+            self.assertNotEqual(cloned_activity.id,original_activity.id)
+            self.assertEqual(cloned_activity.performed_by,testuser2.id)
+            self.assertEqual(cloned_activity.weight,1111111)
+            self.assertEqual(cloned_activity.duration_units,'sec')
+
+    def test_page_workouts(self):
+        """ Are a user's workouts and logs shown newest first, a page at a time? """
+        with self.client as c:
+            testuser1_id = User.query.filter_by(username="testuser1").first().id
+            testuser2_id = User.query.filter_by(username="testuser2").first().id
+            for n in range(WORKOUTS_PAGE_SIZE + 6):
+                db.session.add(Workout(creator=testuser1_id,
+                                    name=f"Paged Workout {n:02}",
+                                    datetime=datetime(2021,1,1) + timedelta(days=n),
+                                    is_private=(n % 2 == 0),
+                                    is_logged=(n % 3 != 0)))
+            db.session.commit()
+
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser1_id
+
+            resp = c.get(f"/users/{testuser1_id}/workouts")
+            html = resp.get_data(as_text=True)
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("Load More",html)
+            self.assertIn(f"Paged Workout {WORKOUTS_PAGE_SIZE + 5:02}",html)
+            self.assertNotIn("Paged Workout 00",html)
+            self.assertLess(html.index(f"Paged Workout {WORKOUTS_PAGE_SIZE + 5:02}"),html.index(f"Paged Workout {WORKOUTS_PAGE_SIZE + 4:02}"))
+
+            workout = Workout.query.filter_by(name="Paged Workout 06").first()
+            resp = c.get(f"/users/{testuser1_id}/workouts",query_string={'after': f"{workout.datetime.isoformat()},{workout.id}"})
+            html = resp.get_data(as_text=True)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn("Load More",html)
+            self.assertNotIn("Paged Workout 06",html)
+            self.assertIn("Paged Workout 05",html)
+            self.assertIn("Paged Workout 00",html)
+
+            resp = c.get(f"/users/{testuser1_id}/workouts?after=yesterday")
+            self.assertEqual(resp.status_code, 400)
+
+            resp = c.get(f"/users/{testuser1_id}/logs")
+            html = resp.get_data(as_text=True)
+            self.assertIn("Paged Workout 29",html)
+            self.assertNotIn("Paged Workout 27",html)
+
+            with c.session_transaction() as sess:
+                sess[USER_KEY] = testuser2_id
+
+            resp = c.get(f"/users/{testuser1_id}/workouts")
+            html = resp.get_data(as_text=True)
+            self.assertIn("Paged Workout 29",html)
+            self.assertNotIn("Paged Workout 28",html)
@@ -0,0 +1,38 @@
+"""Helpers shared by the test suites."""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from models import db
+
+class QueryCounter:
+    """Counts (and keeps) the SQL statements issued while a block runs"""
+
+    def __enter__(self):
+        self.count = 0
+        self.statements = []
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, *args):
+        self.count += 1
+        self.statements.append(' '.join(statement.split()))
+
+class QueryCountAssertions:
+    """TestCase mixin for failing a test when a block or route issues more SQL statements than expected"""
+
+    @contextmanager
+    def assertMaxQueries(self, limit):
+        with QueryCounter() as queries:
+            yield queries
+        if queries.count > limit:
+            self.fail(f"{queries.count} queries issued, expected at most {limit}:\n" + '\n'.join(queries.statements))
+
+    def assertRouteMaxQueries(self, client, url, limit, method='get', **kwargs):
+        """Requests a url with the given client and returns the response, failing if it issued more than limit statements"""
+        with self.assertMaxQueries(limit):
+            resp = getattr(client, method)(url, **kwargs)
+        return resp